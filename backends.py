@@ -0,0 +1,248 @@
+"""
+Inference backends for the vehicle detector.
+
+"pt" runs vehicle_detection.pt through PyTorch, "onnx" runs an ONNX export of it through onnxruntime and
+"onnx-int8" runs a statically quantized copy calibrated on frames of our own footage. Exports are cached next
+to the weights and only rebuilt when the weights are newer. They are built in a temporary file and moved
+into place, so a process loading the model never sees a half-written file; batch.py and segments.py build
+them once before starting their workers.
+
+Example:
+    python backends.py export --int8 --calibration ./recordings
+    python backends.py compare --backend onnx-int8 ./recordings/cam1.mp4
+"""
+
+import argparse, os, re, shutil, sys, tempfile
+
+import cv2
+import numpy as np
+
+from geometry import box_iou
+
+BACKENDS = ("pt", "onnx", "onnx-int8")
+DEFAULT_WEIGHTS = "vehicle_detection.pt"
+IMGSZ = 640
+
+
+def onnx_path(weights, int8=False):
+    return os.path.splitext(weights)[0] + (".int8.onnx" if int8 else ".onnx")
+
+
+def _is_fresh(artifact, weights):
+    """True when the artifact exists and is not older than the weights, or was deployed without them."""
+    if not os.path.exists(artifact):
+        return False
+    return not os.path.exists(weights) or os.path.getmtime(artifact) >= os.path.getmtime(weights)
+
+
+def detect_head_nodes(model):
+    """
+    Names of the nodes of the final Detect head in an ultralytics ONNX export.
+
+    ultralytics names every node after the module it comes from ("/model.22/cv3.0/cv3.0.2/Conv"), the Detect
+    head is the last module. An export named differently gives an empty list.
+    """
+    modules = [re.match(r"/model\.(\d+)/", node.name) for node in model.graph.node]
+    indices = [int(match.group(1)) for match in modules if match]
+    if not indices:
+        return []
+    prefix = f"/model.{max(indices)}/"
+    return [node.name for node in model.graph.node if node.name.startswith(prefix)]
+
+
+def export_onnx(weights=DEFAULT_WEIGHTS):
+    """Exports the weights to ONNX once, returns the cached file on later calls."""
+    path = onnx_path(weights)
+    if not _is_fresh(path, weights):
+        from ultralytics import YOLO
+
+        # ultralytics writes the export next to the weights, so export a copy inside a temporary directory
+        tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            tmp_weights = shutil.copy2(weights, tmp_dir)
+            exported = YOLO(tmp_weights).export(format="onnx", imgsz=IMGSZ, simplify=True)
+            os.replace(exported, path)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return path
+
+
+def letterbox(frame, imgsz=IMGSZ):
+    """Resizes and pads a BGR frame to the square NCHW float input of the exported model."""
+    h, w = frame.shape[:2]
+    r = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * r)), int(round(h * r))
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - new_h) // 2, (imgsz - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    return canvas[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+
+
+def sample_frames(videos, num_frames, window_width=1280):
+    """Evenly spaced frames across all videos, resized the same way start_car_counting does."""
+    from carCount import resize_frame
+
+    per_video = max(1, num_frames // max(1, len(videos)))
+    frames = []
+    for video in videos:
+        cap = cv2.VideoCapture(video)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or per_video
+        for index in np.linspace(0, total - 1, per_video).astype(int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+            success, frame = cap.read()
+            if success:
+                frames.append(resize_frame(frame, window_width))
+        cap.release()
+    return frames
+
+
+def quantize_onnx(weights=DEFAULT_WEIGHTS, calibration_videos=(), num_frames=100):
+    """
+    Statically quantizes the ONNX export to INT8, calibrated on frames sampled from our own footage.
+
+    The Detect head (its box and class convs, DFL and the output concats) stays in float: its box regression
+    and class scores lose the most accuracy in INT8 while it is a small part of the compute. Returns the
+    cached quantized model when it is newer than the weights.
+    """
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    path = onnx_path(weights, int8=True)
+    if _is_fresh(path, weights):
+        return path
+    if not calibration_videos:
+        raise ValueError("INT8 quantization needs calibration videos")
+
+    fp32_path = export_onnx(weights)
+    fp32_model = onnx.load(fp32_path)
+    input_name = fp32_model.graph.input[0].name
+    frames = sample_frames(calibration_videos, num_frames)
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self.frames = iter(frames)
+
+        def get_next(self):
+            frame = next(self.frames, None)
+            return None if frame is None else {input_name: letterbox(frame)}
+
+    tmp_path = f"{path}.{os.getpid()}.tmp.onnx"
+    try:
+        quantize_static(fp32_path, tmp_path, FrameReader(), quant_format=QuantFormat.QDQ,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True,
+                        nodes_to_exclude=detect_head_nodes(fp32_model))
+
+        # Keep the ultralytics metadata (class names, stride, imgsz) so YOLO() can load the quantized file
+        int8_model = onnx.load(tmp_path)
+        del int8_model.metadata_props[:]
+        int8_model.metadata_props.extend(fp32_model.metadata_props)
+        onnx.save(int8_model, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def build_artifacts(backend, weights=DEFAULT_WEIGHTS, calibration_videos=()):
+    """Builds the cached model files of a backend up front, so parallel workers only ever load them."""
+    if backend == "onnx":
+        export_onnx(weights)
+    elif backend == "onnx-int8":
+        quantize_onnx(weights, calibration_videos)
+
+
+def load_model(backend="pt", weights=DEFAULT_WEIGHTS, calibration_videos=()):
+    """Returns a YOLO model for the backend, exporting or quantizing the weights first when needed."""
+    from ultralytics import YOLO
+
+    if backend == "pt":
+        return YOLO(weights)
+    if backend == "onnx":
+        return YOLO(export_onnx(weights), task="detect")
+    if backend == "onnx-int8":
+        return YOLO(quantize_onnx(weights, calibration_videos), task="detect")
+    raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+
+
+def compare_backends(reference, candidate, frames, classes=None, conf=0.5, iou_thresh=0.5):
+    """
+    Accuracy of a candidate backend measured against the reference model's detections.
+
+    A candidate box matches when it has the same class and IoU >= iou_thresh with an unmatched reference box.
+
+    Returns:
+        (dict): precision, recall and F1 against the reference, plus detection counts and mean IoU.
+    """
+    matched, n_ref, n_cand, ious = 0, 0, 0, []
+    for frame in frames:
+        ref = reference.predict(frame, conf=conf, classes=classes, verbose=False)[0].boxes
+        cand = candidate.predict(frame, conf=conf, classes=classes, verbose=False)[0].boxes
+        ref_xyxy, ref_cls = ref.xyxy.cpu().numpy(), ref.cls.cpu().numpy()
+        cand_xyxy, cand_cls = cand.xyxy.cpu().numpy(), cand.cls.cpu().numpy()
+        n_ref += len(ref_xyxy)
+        n_cand += len(cand_xyxy)
+        if not len(ref_xyxy) or not len(cand_xyxy):
+            continue
+        iou = box_iou(cand_xyxy, ref_xyxy)
+        iou[cand_cls[:, None] != ref_cls[None, :]] = 0
+        for i in np.argsort(-iou.max(axis=1)):
+            j = int(iou[i].argmax())
+            if iou[i, j] >= iou_thresh:
+                matched += 1
+                ious.append(iou[i, j])
+                iou[:, j] = 0
+    precision = matched / n_cand if n_cand else 1.0
+    recall = matched / n_ref if n_ref else 1.0
+    return {
+        "frames": len(frames),
+        "reference_detections": n_ref,
+        "candidate_detections": n_cand,
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "mean_iou": float(np.mean(ious)) if ious else 0.0,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export, quantize and compare detector backends.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Build the cached ONNX (and optionally INT8) artifacts")
+    export.add_argument("--weights", default=DEFAULT_WEIGHTS)
+    export.add_argument("--int8", action="store_true", help="Also build the INT8 quantized model")
+    export.add_argument("--calibration", nargs="+", default=[], help="Videos or directories for INT8 calibration")
+    export.add_argument("--num-frames", type=int, default=100, help="Calibration frames")
+    compare = sub.add_parser("compare", help="Report accuracy of a backend against the original weights")
+    compare.add_argument("videos", nargs="+", help="Videos or directories to sample evaluation frames from")
+    compare.add_argument("--backend", choices=BACKENDS[1:], default="onnx-int8")
+    compare.add_argument("--weights", default=DEFAULT_WEIGHTS)
+    compare.add_argument("--num-frames", type=int, default=200, help="Evaluation frames")
+    compare.add_argument("--classes", nargs="+", type=int, default=[1, 2, 3, 4], help="Class ids to compare")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from batch import find_videos
+
+    args = parse_args(argv)
+    if args.command == "export":
+        print(f"ONNX model: {export_onnx(args.weights)}")
+        if args.int8:
+            path = quantize_onnx(args.weights, find_videos(args.calibration), args.num_frames)
+            print(f"INT8 model: {path}")
+        return 0
+
+    videos = find_videos(args.videos)
+    frames = sample_frames(videos, args.num_frames)
+    report = compare_backends(load_model("pt", args.weights), load_model(args.backend, args.weights, videos),
+                              frames, classes=args.classes)
+    print(f"{args.backend} vs pt on {report['frames']} frames:")
+    for key in ("reference_detections", "candidate_detections", "precision", "recall", "f1", "mean_iou"):
+        value = report[key]
+        print(f"  {key}: {value:.4f}" if isinstance(value, float) else f"  {key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
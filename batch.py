@@ -0,0 +1,280 @@
+"""
+Headless batch runner for start_car_counting.
+
+Runs many videos through the counter in a pool of worker processes without opening any window.
+
+Example:
+    python batch.py ./recordings --points 20 400 1260 400 --classes 1 2 3 4 --workers 4
+
+A job file can be used instead of (or together with) command line inputs. It is a JSON list where each
+entry overrides the command line defaults:
+    [{"video": "cam1.mp4", "points": [100, 100, 600, 100, 600, 500, 100, 500]}]
+
+Region points are given as a flat x/y list in the 1280-wide frame coordinates used by the GUI, 2 points
+count a line and 3 or more a polygon. Every video needs its own file name: videos with the same name in
+different directories need distinct "csv_name" and "video_output" entries in the job file.
+
+Several named lines/regions can be counted at once with --regions regions.json (or a "regions" job entry),
+a JSON object {"name": [x1, y1, x2, y2, ...]}: 2 points make a line, 3 or more a polygon.
+"""
+
+import argparse, json, os, sys, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov")
+DEFAULT_CLASSES = [1, 2, 3, 4]
+
+
+def find_videos(inputs):
+    """Expands a list of files and directories into a sorted list of video paths."""
+    videos = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(VIDEO_EXTENSIONS):
+                    videos.append(os.path.join(path, name))
+        else:
+            videos.append(path)
+    return videos
+
+
+def check_points(points, mode=None):
+    """Validates region points against the counting mode, inferred from the point count when None."""
+    if len(points) % 2:
+        raise ValueError(f"Region points must be x/y pairs, got {len(points)} values")
+    n_points = len(points) // 2
+    if n_points < 2:
+        raise ValueError(f"Region points need 2 points for a line or >= 3 for a polygon, got {n_points}")
+    if mode == "line" and n_points != 2:
+        raise ValueError(f"Line mode needs exactly 2 points, got {n_points}")
+    if mode == "polygon" and n_points < 3:
+        raise ValueError(f"Polygon mode needs at least 3 points, got {n_points}")
+    return [int(p) for p in points]
+
+
+def build_jobs(args):
+    """Builds the list of job dicts from the command line and the optional job file."""
+    defaults = {
+        "points": args.points,
+        "classes": args.classes,
+        "speed": args.speed,
+        "output_dir": args.output_dir,
+        "pipelined": args.pipelined,
+        "detect_stride": args.detect_stride,
+        "roi_crop": args.roi_crop,
+        "speed_calibration": None,
+        "events": args.events,
+        "event_rotate_seconds": args.event_rotate_seconds,
+        "event_rotate_bytes": args.event_rotate_bytes,
+        "analytics_only": args.analytics_only,
+        "backend": args.backend,
+        "regions": None,
+        "metrics": args.metrics,
+        "live": args.live,
+        "checkpoint_interval": args.checkpoint_interval,
+        "resume": args.resume,
+        "clips": args.clips,
+        "video_rotate_seconds": args.video_rotate_seconds,
+        "fused_preprocess": args.fused_preprocess,
+        "motion_gate": args.motion_gate,
+        "bins": args.bins,
+        "tracker": args.tracker,
+    }
+    if args.regions:
+        with open(args.regions) as file:
+            defaults["regions"] = json.load(file)
+    if args.calibration:
+        with open(args.calibration) as file:
+            defaults["speed_calibration"] = json.load(file)
+    entries = [{"video": video} for video in find_videos(args.inputs)]
+    if args.job_file:
+        with open(args.job_file) as file:
+            spec = json.load(file)
+        for entry in spec:
+            videos = find_videos([entry["video"]])
+            entries.extend(dict(entry, video=video) for video in videos)
+
+    jobs = []
+    for entry in entries:
+        job = dict(defaults, **entry)
+        if job["regions"]:
+            job["regions"] = {name: check_points(points) for name, points in job["regions"].items()}
+            job["points"] = job["points"] or []
+        elif not job["points"]:
+            raise ValueError(f"No region points given for {job['video']}")
+        else:
+            job["points"] = check_points(job["points"], job.get("mode"))
+        name = os.path.splitext(os.path.basename(job["video"]))[0]
+        job.setdefault("video_output", os.path.join(job["output_dir"], "video", f"{name}.avi"))
+        job.setdefault("csv_name", name)
+        jobs.append(job)
+
+    # Jobs run in parallel, two of them writing the same files would overwrite each other's results
+    outputs = {}
+    for job in jobs:
+        keys = [("csv", os.path.abspath(os.path.join(job["output_dir"], job["csv_name"])))]
+        if not job["analytics_only"]:
+            keys.append(("video", os.path.abspath(job["video_output"])))
+        for key in keys:
+            if key in outputs:
+                raise ValueError(f"{outputs[key]} and {job['video']} would write the same {key[0]} output, "
+                                 f"give them distinct csv_name/video_output in a job file")
+            outputs[key] = job["video"]
+    return jobs
+
+
+def run_job(job):
+    """Worker entry point, runs one video and returns its summary."""
+    import torch
+    import carCount  # imported in the worker so every process loads its own model
+
+    # Every worker gets its share of the cores instead of torch using all of them in each process
+    torch.set_num_threads(job["threads"])
+
+    if not job["analytics_only"]:
+        os.makedirs(os.path.dirname(job["video_output"]) or ".", exist_ok=True)
+    metrics = None
+    if job["metrics"]:
+        from metrics import JsonFileSink, Metrics
+
+        metrics = Metrics(JsonFileSink(os.path.join(job["output_dir"], "metrics", f"{job['csv_name']}.json")))
+    return carCount.start_car_counting(job["video"],
+                                       job["video_output"],
+                                       job["points"],
+                                       job["speed"],
+                                       job["classes"],
+                                       view_img=False,
+                                       csv_name=job["csv_name"],
+                                       csv_dir=os.path.join(job["output_dir"], "csv"),
+                                       pipelined=job["pipelined"],
+                                       detect_stride=job["detect_stride"],
+                                       roi_crop=job["roi_crop"],
+                                       speed_calibration=job["speed_calibration"],
+                                       event_format=job["events"],
+                                       event_rotate_seconds=job["event_rotate_seconds"],
+                                       event_rotate_bytes=job["event_rotate_bytes"],
+                                       analytics_only=job["analytics_only"],
+                                       backend=job["backend"],
+                                       regions=job["regions"],
+                                       metrics=metrics,
+                                       live=job["live"],
+                                       checkpoint_interval=job["checkpoint_interval"],
+                                       resume=job["resume"],
+                                       clips=job["clips"],
+                                       video_rotate_seconds=job["video_rotate_seconds"],
+                                       fused_preprocess=job["fused_preprocess"],
+                                       motion_gate=job["motion_gate"],
+                                       bin_seconds=job["bins"],
+                                       tracker_cfg=job["tracker"])
+
+
+def print_summary(summaries, failures, elapsed):
+    total_frames = sum(s["frames"] for s in summaries)
+    total_in = sum(s["in_counts"] for s in summaries)
+    total_out = sum(s["out_counts"] for s in summaries)
+    print("\n===== Summary =====")
+    print(f"Videos processed: {len(summaries)}, failed: {len(failures)}")
+    print(f"Frames: {total_frames}, wall time: {elapsed:.1f}s, "
+          f"aggregate throughput: {total_frames / elapsed if elapsed > 0 else 0:.1f} fps")
+    print(f"In counts: {total_in}, out counts: {total_out}")
+    for video, error in failures:
+        print(f"FAILED {video}: {error}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Count vehicles in many videos without a display.")
+    parser.add_argument("inputs", nargs="*", help="Video files or directories containing videos")
+    parser.add_argument("--job-file", help="JSON list of per-video job overrides")
+    parser.add_argument("--points", nargs="+", type=int, default=None,
+                        help="Region points as x1 y1 x2 y2 ... in 1280-wide frame coordinates")
+    parser.add_argument("--regions", help='JSON file {"name": [x1, y1, x2, y2, ...]} of regions counted together')
+    parser.add_argument("--classes", nargs="+", type=int, default=DEFAULT_CLASSES, help="Class ids to count")
+    parser.add_argument("--speed", action="store_true", help="Enable speed estimation")
+    parser.add_argument("--calibration",
+                        help='JSON file {"image_points": [[x, y] x4], "world_points": [[X, Y] x4]} in meters')
+    parser.add_argument("--pipelined", action="store_true",
+                        help="Run decode, inference, annotation and encode on separate threads")
+    parser.add_argument("--detect-stride", type=int, default=1,
+                        help="Run the detector on every Nth frame and interpolate boxes in between")
+    parser.add_argument("--roi-crop", action="store_true",
+                        help="Run the detector only on a padded crop around the region points")
+    parser.add_argument("--events", choices=["csv", "jsonl", "sqlite"], default=None,
+                        help="Stream every crossing event to the csv directory while processing")
+    parser.add_argument("--event-rotate-seconds", type=float, default=None,
+                        help="Start a new event file every N seconds, e.g. 3600")
+    parser.add_argument("--event-rotate-bytes", type=int, default=None,
+                        help="Start a new event file once the current one reaches N bytes")
+    parser.add_argument("--bins", nargs="+", type=float, default=None,
+                        help="Write in/out counts per class in video time bins of these widths, e.g. 60 300 900")
+    parser.add_argument("--analytics-only", action="store_true",
+                        help="Only count and record events, skip all drawing and video encoding")
+    parser.add_argument("--backend", choices=["pt", "onnx", "onnx-int8"], default="pt",
+                        help="Inference backend, build the ONNX artifacts first with backends.py export")
+    parser.add_argument("--tracker", default="botsort.yaml",
+                        help="Ultralytics tracker config (botsort.yaml, bytetrack.yaml, custom yaml) or iou")
+    parser.add_argument("--live", action="store_true",
+                        help="Inputs are live RTSP/HTTP streams, newest frame wins; files are replayed at native fps")
+    parser.add_argument("--fused-preprocess", action="store_true",
+                        help="Resize decoded frames once straight into the model input instead of twice")
+    parser.add_argument("--motion-gate", action="store_true",
+                        help="Skip the detector while nothing moves around the region points")
+    parser.add_argument("--clips", action="store_true",
+                        help="Only record short clips around counted crossings instead of the whole video")
+    parser.add_argument("--video-rotate-seconds", type=float, default=None,
+                        help="Start a new output video file every N seconds of video time, e.g. 3600")
+    parser.add_argument("--checkpoint-interval", type=float, default=None,
+                        help="Save a resumable checkpoint of every job every N seconds")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue jobs from their last checkpoint instead of starting over")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Write per-stage latency percentiles and frame counters to <output-dir>/metrics/")
+    parser.add_argument("--output-dir", default="./output/", help="Directory for videos and csv files")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Number of worker processes")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    jobs = build_jobs(args)
+    if not jobs:
+        print("No videos to process.")
+        return 1
+
+    # Exports/quantized models are built here once, workers building them in parallel would race on the same file
+    import backends
+
+    for backend in sorted({job["backend"] for job in jobs}):
+        videos = [job["video"] for job in jobs if job["backend"] == backend]
+        backends.build_artifacts(backend, calibration_videos=videos)
+
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    for job in jobs:
+        job["threads"] = threads
+    print(f"Processing {len(jobs)} video(s) with {args.workers} worker(s), {threads} thread(s) each")
+    summaries, failures = [], []
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(run_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            video = futures[future]["video"]
+            try:
+                summary = future.result()
+            except Exception as error:
+                failures.append((video, error))
+                print(f"[error] {video}: {error}")
+                continue
+            summaries.append(summary)
+            print(f"[done] {video}: {summary['frames']} frames in {summary['seconds']:.1f}s "
+                  f"({summary['fps']:.1f} fps), in={summary['in_counts']} out={summary['out_counts']}")
+            if "idle_frames" in summary:
+                print(f"    motion gate skipped {summary['idle_frames']} idle frames")
+            for name, counts in summary.get("regions", {}).items():
+                print(f"    {name}: in={counts['in']} out={counts['out']}")
+
+    print_summary(summaries, failures, time.perf_counter() - start_time)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
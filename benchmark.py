@@ -0,0 +1,370 @@
+"""
+Stage-level benchmarks of the counting loop on synthetic data, CPU only and offline.
+
+A synthetic road video is rendered once with a known number of vehicles moving across the frame, together
+with the matching ground-truth boxes and track ids. Every stage of start_car_counting is then timed on its
+own in a fresh process, so one stage's memory does not show up in another's peak RSS:
+
+    decode      cv2.VideoCapture.read of the source-sized video
+    resize      carCount.resize_frame to the 1280-wide working size
+    inference   detector forward pass (skipped when the weights file is missing)
+    tracking    each tracker of --trackers fed with noisy synthetic detections (jittered boxes, random scores,
+                dropped boxes); besides the latency the ID switches against the ground-truth ids are reported
+    count       ObjectCounter.extract_and_process_tracks with drawing, as in a normal run
+    count_analytics  the same without an image, as in analytics_only mode
+    annotate    carCount.annotate_frame (results.plot + time overlay)
+    encode      cv2.VideoWriter.write of the annotated frame
+
+Results (FPS, mean/p50/p95 latency in ms, peak RSS in MB) are written as JSON, tagged with the git commit.
+
+Example:
+    python benchmark.py --frames 300 --vehicles 20
+    python benchmark.py --stages tracking --trackers botsort.yaml bytetrack.yaml iou
+    python benchmark.py --compare output/bench/bench_a1b2c3d.json output/bench/bench_e4f5a6b.json
+"""
+
+import argparse, datetime, json, os, platform, subprocess, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import cv2
+import numpy as np
+
+STAGES = ("decode", "resize", "inference", "tracking", "count", "count_analytics", "annotate", "encode")
+NAMES = {0: "person", 1: "car", 2: "motorcycle", 3: "bus", 4: "truck"}
+WINDOW_WIDTH, WINDOW_HEIGHT = 1280, 720
+OUTPUT_DIR = "./output/bench/"
+
+
+def synthetic_tracks(num_frames, num_vehicles, seed=0):
+    """
+    Ground-truth boxes of vehicles driving left to right across a 1280x720 frame.
+
+    Each vehicle keeps its lane and speed, a vehicle leaving the frame comes back on the left with a new id,
+    so the number of vehicles on screen stays at num_vehicles.
+
+    Returns:
+        (list): One (N, 7) float32 array [x1, y1, x2, y2, track_id, conf, cls] per frame.
+    """
+    rng = np.random.default_rng(seed)
+    lanes = rng.uniform(80, WINDOW_HEIGHT - 80, num_vehicles)
+    speeds = rng.uniform(4, 16, num_vehicles)
+    sizes = rng.uniform(40, 110, (num_vehicles, 2)) * [1.0, 0.6]
+    offsets = rng.uniform(0, WINDOW_WIDTH, num_vehicles)
+    classes = rng.choice([1, 2, 3, 4], num_vehicles)
+    span = WINDOW_WIDTH + 200
+
+    frames = []
+    for t in range(num_frames):
+        travelled = offsets + speeds * t
+        laps = (travelled // span).astype(int)
+        cx = travelled % span - 100
+        ids = laps * num_vehicles + np.arange(num_vehicles) + 1
+        boxes = np.stack([cx - sizes[:, 0] / 2, lanes - sizes[:, 1] / 2,
+                          cx + sizes[:, 0] / 2, lanes + sizes[:, 1] / 2], axis=1)
+        boxes = np.clip(boxes, 0, [WINDOW_WIDTH, WINDOW_HEIGHT, WINDOW_WIDTH, WINDOW_HEIGHT])
+        visible = (boxes[:, 2] - boxes[:, 0]) > 4
+        data = np.concatenate([boxes, ids[:, None], np.full((num_vehicles, 1), 0.9), classes[:, None]], axis=1)
+        frames.append(data[visible].astype(np.float32))
+    return frames
+
+
+def noisy_detections(data, rng, noise=2.0, drop=0.05):
+    """Detector-like copy of ground-truth boxes: jittered by `noise` pixels, random scores, `drop` of them missing."""
+    data = data[rng.random(len(data)) >= drop].copy()
+    data[:, :4] += rng.normal(0, noise, (len(data), 4))
+    data[:, 5] = rng.uniform(0.3, 0.95, len(data))
+    return data
+
+
+def synthetic_video(path, tracks, width, height, fps=30):
+    """Renders the synthetic tracks at width x height, boxes are scaled from 1280x720."""
+    scale = np.array([width / WINDOW_WIDTH, height / WINDOW_HEIGHT] * 2)
+    background = np.full((height, width, 3), 90, dtype=np.uint8)
+    for y in np.linspace(0, height, 7)[1:-1].astype(int):
+        cv2.line(background, (0, y), (width, y), (200, 200, 200), max(1, height // 360))
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for data in tracks:
+        frame = background.copy()
+        for x1, y1, x2, y2, track_id, _, cls in data:
+            x1, y1, x2, y2 = (np.array([x1, y1, x2, y2]) * scale).astype(int)
+            color = (int(track_id * 67) % 256, int(track_id * 131) % 256, int(cls * 60) % 256)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, -1)
+        writer.write(frame)
+    writer.release()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        import psutil
+
+        return psutil.Process().memory_info().peak_wset / 2 ** 20
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10
+
+
+def summarize(latencies, warmup):
+    """FPS and latency percentiles of the per-frame latencies (seconds), ignoring the warmup frames."""
+    latencies = np.asarray(latencies[warmup:] if len(latencies) > warmup else latencies) * 1000
+    if not len(latencies):
+        return {"frames": 0}
+    return {
+        "frames": int(len(latencies)),
+        "fps": float(1000 / latencies.mean()) if latencies.mean() > 0 else 0.0,
+        "mean_ms": float(latencies.mean()),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def working_frames(video_path):
+    """Decoded frames of the synthetic video resized to the working size, decoding is not timed."""
+    from carCount import resize_frame
+
+    cap = cv2.VideoCapture(video_path)
+    while True:
+        success, frame = cap.read()
+        if not success:
+            break
+        yield resize_frame(frame, WINDOW_WIDTH)
+    cap.release()
+
+
+def make_results(frame, data, with_ids=True):
+    """Wraps synthetic boxes into an ultralytics Results, like model.track/predict return."""
+    import torch
+    from ultralytics.engine.results import Results
+
+    boxes = data if with_ids else data[:, [0, 1, 2, 3, 5, 6]]
+    return [Results(orig_img=frame, path="", names=NAMES, boxes=torch.as_tensor(boxes))]
+
+
+def run_stage(stage, config):
+    """Worker entry point, times one stage and returns its summary."""
+    timer = time.perf_counter
+    latencies = []
+    tracks = synthetic_tracks(config["frames"], config["vehicles"], config["seed"])
+
+    if stage == "decode":
+        cap = cv2.VideoCapture(config["video"])
+        while True:
+            start = timer()
+            success, _ = cap.read()
+            if not success:
+                break
+            latencies.append(timer() - start)
+        cap.release()
+
+    elif stage == "resize":
+        from carCount import resize_frame
+
+        cap = cv2.VideoCapture(config["video"])
+        while True:
+            success, frame = cap.read()
+            if not success:
+                break
+            start = timer()
+            resize_frame(frame, WINDOW_WIDTH)
+            latencies.append(timer() - start)
+        cap.release()
+
+    elif stage == "inference":
+        if not os.path.exists(config["weights"]):
+            return {"skipped": f"weights {config['weights']} not found"}
+        import backends
+
+        model = backends.load_model(config["backend"], config["weights"], [config["video"]])
+        for frame in working_frames(config["video"]):
+            start = timer()
+            model.predict(frame, conf=0.5, classes=[1, 2, 3, 4], device="cpu", verbose=False)
+            latencies.append(timer() - start)
+
+    elif stage == "tracking":
+        from types import SimpleNamespace
+        from tracking import create_tracker
+
+        tracker = create_tracker(config["tracker"], frame_rate=int(config["fps"]))
+        if config["tracker"] != "iou":
+            from ultralytics.engine.results import Boxes
+        rng = np.random.default_rng(config["seed"])
+        assigned, switches, matched = {}, 0, 0
+        for frame, data in zip(working_frames(config["video"]), tracks):
+            detections = noisy_detections(data, rng, config["track_noise"], config["track_drop"])
+            if config["tracker"] == "iou":
+                # IOUTracker only reads the xyxy, conf and cls arrays
+                det = SimpleNamespace(xyxy=detections[:, :4], conf=detections[:, 5], cls=detections[:, 6])
+            else:
+                det = Boxes(detections[:, [0, 1, 2, 3, 5, 6]], frame.shape[:2])
+            start = timer()
+            output = tracker.update(det, frame)
+            latencies.append(timer() - start)
+            # The last output column is the detection index, which gives the ground-truth id of the box
+            for track_id, index in np.asarray(output).reshape(-1, 8)[:, [4, 7]].astype(int):
+                truth = detections[index, 4]
+                switches += assigned.get(truth, track_id) != track_id
+                assigned[truth] = track_id
+                matched += 1
+        return dict(summarize(latencies, config["warmup"]), peak_rss_mb=peak_rss_mb(), id_switches=int(switches),
+                    matched_boxes=matched, id_switch_rate=switches / matched if matched else 0.0)
+
+    elif stage in ("count", "count_analytics"):
+        from carCount import create_counter, format_time_info
+
+        line = [(WINDOW_WIDTH // 2, 0), (WINDOW_WIDTH // 2, WINDOW_HEIGHT)]
+        counter = create_counter(line, config["speed"], view_img=False, names=NAMES)
+        for index, (frame, data) in enumerate(zip(working_frames(config["video"]), tracks)):
+            results = make_results(frame, data)
+            timestamp = index / config["fps"]
+            counter.im0 = frame if stage == "count" else None
+            start = timer()
+            counter.extract_and_process_tracks(results, format_time_info(timestamp * 1000), timestamp)
+            latencies.append(timer() - start)
+
+    elif stage == "annotate":
+        from carCount import annotate_frame, format_time_info
+
+        for index, (frame, data) in enumerate(zip(working_frames(config["video"]), tracks)):
+            results = make_results(frame, data)
+            time_info = format_time_info(index / config["fps"] * 1000)
+            start = timer()
+            annotate_frame(results, time_info)
+            latencies.append(timer() - start)
+
+    elif stage == "encode":
+        from carCount import create_video_writer
+
+        path = os.path.join(config["output_dir"], f"encode_{os.getpid()}.mp4")
+        writer = create_video_writer(path, WINDOW_WIDTH, WINDOW_HEIGHT)
+        for frame in working_frames(config["video"]):
+            start = timer()
+            writer.write(frame)
+            latencies.append(timer() - start)
+        writer.release()
+        os.remove(path)
+
+    else:
+        raise ValueError(f"Unknown stage '{stage}', expected one of {STAGES}")
+
+    return dict(summarize(latencies, config["warmup"]), peak_rss_mb=peak_rss_mb())
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(config, stages=STAGES):
+    """Renders the synthetic video if needed and runs every stage in its own process."""
+    os.makedirs(config["output_dir"], exist_ok=True)
+    name = f"synthetic_{config['width']}x{config['height']}_{config['frames']}f_{config['vehicles']}v_{config['seed']}.mp4"
+    config["video"] = os.path.join(config["output_dir"], name)
+    if not os.path.exists(config["video"]):
+        print(f"Rendering {config['video']}")
+        tracks = synthetic_tracks(config["frames"], config["vehicles"], config["seed"])
+        synthetic_video(config["video"], tracks, config["width"], config["height"], config["fps"])
+
+    results = {}
+    for stage in stages:
+        if stage == "tracking":
+            variants = [(f"tracking:{name}", dict(config, tracker=name)) for name in config["trackers"]]
+        else:
+            variants = [(stage, config)]
+        for key, stage_config in variants:
+            # A fresh process per stage keeps peak RSS and warm caches from leaking between stages
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                try:
+                    results[key] = executor.submit(run_stage, stage, stage_config).result()
+                except Exception as error:
+                    results[key] = {"error": f"{type(error).__name__}: {error}"}
+            print_stage(key, results[key])
+
+    return {
+        "commit": git_commit(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "python": platform.python_version(),
+        "config": config,
+        "stages": results,
+    }
+
+
+def print_stage(stage, result):
+    if "fps" in result:
+        id_switches = ""
+        if "id_switches" in result:
+            id_switches = f"  ID switches {result['id_switches']} ({result['id_switch_rate'] * 100:.2f}% of boxes)"
+        print(f"{stage:>24}: {result['fps']:8.1f} fps  p50 {result['p50_ms']:7.2f} ms  "
+              f"p95 {result['p95_ms']:7.2f} ms  peak RSS {result['peak_rss_mb']:7.1f} MB{id_switches}")
+    else:
+        print(f"{stage:>24}: {result.get('skipped') or result.get('error') or 'no frames'}")
+
+
+def compare(baseline_path, candidate_path):
+    """Prints the per-stage change between two result files, negative FPS change means slower."""
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    with open(candidate_path) as file:
+        candidate = json.load(file)
+    print(f"{baseline['commit']} -> {candidate['commit']}")
+    for stage, new in candidate["stages"].items():
+        old = baseline["stages"].get(stage, {})
+        if "fps" not in old or "fps" not in new:
+            continue
+        change = (new["fps"] - old["fps"]) / old["fps"] * 100 if old["fps"] else 0.0
+        print(f"{stage:>24}: {old['fps']:8.1f} -> {new['fps']:8.1f} fps ({change:+6.1f}%)  "
+              f"p95 {old['p95_ms']:7.2f} -> {new['p95_ms']:7.2f} ms  "
+              f"peak RSS {old['peak_rss_mb']:7.1f} -> {new['peak_rss_mb']:7.1f} MB")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the counting loop on synthetic data.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES), help="Stages to run")
+    parser.add_argument("--frames", type=int, default=300, help="Frames in the synthetic video")
+    parser.add_argument("--vehicles", type=int, default=20, help="Vehicles on screen in every frame")
+    parser.add_argument("--width", type=int, default=1920, help="Source video width")
+    parser.add_argument("--height", type=int, default=1080, help="Source video height")
+    parser.add_argument("--fps", type=float, default=30, help="Source video frame rate")
+    parser.add_argument("--warmup", type=int, default=10, help="Frames per stage left out of the statistics")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic traffic")
+    parser.add_argument("--speed", action="store_true", help="Enable speed estimation in the count stages")
+    parser.add_argument("--backend", choices=["pt", "onnx", "onnx-int8"], default="pt", help="Inference backend")
+    parser.add_argument("--weights", default="vehicle_detection.pt", help="Detector weights")
+    parser.add_argument("--trackers", nargs="+", default=["botsort.yaml", "bytetrack.yaml", "iou"],
+                        help="Trackers compared by the tracking stage, ultralytics yaml configs or iou")
+    parser.add_argument("--track-noise", type=float, default=2.0,
+                        help="Standard deviation in pixels of the jitter added to the tracking stage detections")
+    parser.add_argument("--track-drop", type=float, default=0.05,
+                        help="Fraction of the tracking stage detections dropped, like missed detections")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="Directory for the video and results")
+    parser.add_argument("--output", help="Results JSON file, defaults to bench_<commit>.json in the output dir")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"),
+                        help="Compare two result files instead of running")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    config = {key: getattr(args, key) for key in ("frames", "vehicles", "width", "height", "fps", "warmup", "seed",
+                                                   "speed", "backend", "weights", "trackers", "track_noise",
+                                                   "track_drop", "output_dir")}
+    report = run_benchmarks(config, args.stages)
+    output = args.output or os.path.join(args.output_dir, f"bench_{report['commit'] or 'nogit'}.json")
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Crossing counts in fixed-width video time bins, aggregated while the video runs.
+
+Every bin width (1, 5 and 15 minutes by default) has exactly one open bin holding counts per region, class
+and direction. A crossing adds one to the open bin of each width; once video time passes the end of a bin
+it is written to the sink as one row per region and class and dropped, so memory does not grow with the
+length of the video. Bins without crossings produce no rows.
+
+Example:
+    sink = events.create_event_sink("csv", "./output/csv/", "cam1_bins", fields=BIN_FIELDS, table="bins")
+    counter.bins = TimeBins((60, 300, 900), sink)
+"""
+
+from collections import defaultdict
+
+BIN_FIELDS = ["bin_seconds", "bin_start", "bin_end", "region", "class_name", "in_count", "out_count"]
+
+
+class TimeBins:
+    """
+    Open bins of several widths, flushed to a sink as video time passes them.
+
+    Args:
+        widths (tuple): Bin widths in seconds of video time.
+        sink (events.EventSink): Receives one BIN_FIELDS record per region and class of every closed bin.
+    """
+
+    def __init__(self, widths=(60, 300, 900), sink=None):
+        self.widths = tuple(widths)
+        self.sink = sink
+        self.index = [None] * len(self.widths)  # index of the open bin per width, start = index * width
+        self.counts = [defaultdict(lambda: [0, 0]) for _ in self.widths]  # (region, class) -> [in, out]
+
+    def add(self, timestamp, class_name, direction, region=None):
+        """Counts one crossing at video time `timestamp` (seconds)."""
+        self.advance(timestamp)
+        column = 0 if direction == "in" else 1
+        for counts in self.counts:
+            counts[(region, class_name)][column] += 1
+
+    def advance(self, timestamp):
+        """Closes the bins video time `timestamp` has moved past, cheap enough to call every frame."""
+        for k, width in enumerate(self.widths):
+            index = int(timestamp // width)
+            if self.index[k] is None:
+                self.index[k] = index
+            elif index > self.index[k]:
+                self._flush(k)
+                self.index[k] = index
+            # An older timestamp (video time going back) is counted in the open bin
+
+    def close(self):
+        """Writes out the open bins, e.g. at the end of the video."""
+        for k in range(len(self.widths)):
+            if self.index[k] is not None:
+                self._flush(k)
+
+    def _flush(self, k):
+        width, counts = self.widths[k], self.counts[k]
+        if self.sink is not None:
+            start = self.index[k] * width
+            for (region, class_name), (in_count, out_count) in counts.items():
+                self.sink.write({"bin_seconds": width, "bin_start": start, "bin_end": start + width,
+                                 "region": region, "class_name": class_name,
+                                 "in_count": in_count, "out_count": out_count})
+        counts.clear()
+
+    def state_dict(self):
+        return {"index": list(self.index), "counts": [{key: list(value) for key, value in counts.items()}
+                                                      for counts in self.counts]}
+
+    def load_state_dict(self, state):
+        self.index = list(state["index"])
+        for counts, saved in zip(self.counts, state["counts"]):
+            counts.clear()
+            counts.update({key: list(value) for key, value in saved.items()})
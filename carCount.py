@@ -1,14 +1,30 @@
 import cv2
-from ultralytics import YOLO
 
 from datetime import timedelta
-from ultralytics import RTDETR
-import supervision as sv
-import tracker, csv, datetime, os
+from collections import deque
+import tracker, pipeline, events, backends, livestream, checkpoint, videowriter, motion, bins, csv, datetime, math, os, threading, time
 
 
-# Load the  model
-model = YOLO('vehicle_detection.pt')
+# The model (and with it torch/ultralytics) is loaded on first use, call preload_model() to load it in the background
+model = None
+backend_models = {}
+model_lock = threading.Lock()
+
+def get_model(backend="pt", calibration_videos=()):
+  """Model for the inference backend ("pt", "onnx" or "onnx-int8"), loaded once per process."""
+  global model
+  with model_lock:
+    if backend not in backend_models:
+      backend_models[backend] = backends.load_model(backend, calibration_videos=calibration_videos)
+    if backend == "pt":
+      model = backend_models[backend]
+    return backend_models[backend]
+
+def preload_model(backend="pt"):
+  """Starts loading the model on a background thread, get_model() waits for it to finish."""
+  thread = threading.Thread(target=get_model, args=(backend,), daemon=True)
+  thread.start()
+  return thread
 
 class RectPointsHandler:
   def __init__(self):
@@ -32,8 +48,7 @@ class VideoHandler:
 class csvHandler:
     def __init__(self):
         self.csv_writer_path = None
-    def export_to_csv(self, data, filename):
-        output_dir = "./output/csv/"
+    def export_to_csv(self, data, filename, output_dir="./output/csv/"):
         os.makedirs(output_dir, exist_ok=True)  # Create the directory if it doesn't exist
         
         current_datetime = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
@@ -53,6 +68,8 @@ class csvHandler:
         print(f"CSV file '{csv_filepath}' written successfully.")
 
 def get_video_info(video_path):
+  import supervision as sv
+
   # Extracting information about the video
   video_info = sv.VideoInfo.from_video_path(video_path)
   width, height, fps, total_frames = video_info.width, video_info.height, video_info.fps, video_info.total_frames
@@ -66,83 +83,550 @@ def get_video_info(video_path):
   print(f"\033[1mLength:\033[0m {video_length}")
 
 
-def get_time_info(cap):
-  current_time = int(cap.get(cv2.CAP_PROP_POS_MSEC))
+def format_time_info(current_time):
+  current_time = int(current_time)
   hours = str(int(current_time / 3600000)).zfill(2)
   minutes = str(int(current_time / 60000)).zfill(2)
   seconds = str(int((current_time % 60000) / 1000)).zfill(2)
   time_info = [hours, minutes, seconds]
   return time_info
 
-def start_car_counting(video_path, video_writer_path, rect_points, speed_estimation_btn, selected_vehicles):
+def get_time_info(cap):
+  return format_time_info(cap.get(cv2.CAP_PROP_POS_MSEC))
+
+def get_frame_timestamp(cap, frame_idx, fps):
+  """Video time of the last read/grabbed frame in seconds, from its PTS or from the frame index as fallback."""
+  current_time = cap.get(cv2.CAP_PROP_POS_MSEC)
+  if current_time <= 0 and frame_idx > 0 and fps > 0:
+    current_time = frame_idx * 1000.0 / fps
+  return current_time / 1000.0
+
+def resize_frame(frame, window_width):
+  (h, w) = frame.shape[:2]
+  # Resize frame based on desired output width or maintain aspect ratio
+  if window_width:
+    r = window_width / float(w)  # Use desired width for resizing
+  else:
+      # Maintain aspect ratio for resizing
+      max_dim = 1024  # Adjust as needed to limit maximum dimension
+      if max(h, w) > max_dim:
+        r = max_dim / float(max(h, w))
+      else:
+        r = 1  # No resizing needed if both dimensions are within limit
+
+  dim = (int(w * r), int(h * r))
+  return cv2.resize(frame, dim, interpolation=cv2.INTER_AREA)
+
+def parse_region_points(rect_points):
+  """Turns the flat [x1, y1, x2, y2, ...] list from the GUI into [(x1, y1), (x2, y2), ...]."""
+  return [(rect_points[i], rect_points[i+1]) for i in range(0, len(rect_points), 2)]
+
+def create_counter(region_points, speed_estimation, view_img, speed_calibration=None, names=None, regions=None):
+  counter = tracker.ObjectCounter()
+  counter.set_args(view_img=view_img,
+          reg_pts=region_points,
+          classes_names=names or get_model().names,
+          draw_tracks=False,
+          speed_estimation=speed_estimation,
+          homography=create_calibration(speed_calibration),
+          regions=regions,)
+  return counter
+
+def create_video_writer(video_writer_path, window_width=1280, window_height=720, fps=10):
+  return cv2.VideoWriter(video_writer_path,
+              cv2.VideoWriter_fourcc(*'mp4v'),
+              fps,
+              (window_width, window_height))
+
+def create_calibration(speed_calibration):
+  """Homography from a {"image_points": [...], "world_points": [...]} dict, None leaves speed in pixels."""
+  if not speed_calibration:
+    return None
+  return tracker.homography_from_points(speed_calibration["image_points"], speed_calibration["world_points"])
+
+def annotate_frame(results, time_info):
+  annotated_frame = results[0].plot(labels=False)
+
+  time_text = f"{time_info[0]}:{time_info[1]}:{time_info[2]}"
+  cv2.putText(annotated_frame, time_text, (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+  return annotated_frame
+
+def roi_crop_box(region_points, frame_width, frame_height, padding=100):
+  """Padded bounding box (x1, y1, x2, y2) around the counting region, clamped to the frame."""
+  xs = [p[0] for p in region_points]
+  ys = [p[1] for p in region_points]
+  x1 = max(0, int(min(xs)) - padding)
+  y1 = max(0, int(min(ys)) - padding)
+  x2 = min(frame_width, int(max(xs)) + padding)
+  y2 = min(frame_height, int(max(ys)) + padding)
+  return x1, y1, x2, y2
+
+def roi_imgsz(crop_box, frame_width, frame_height, imgsz=640):
+  """Inference size for the crop that keeps the same pixels-per-object as running the full frame at imgsz."""
+  x1, y1, x2, y2 = crop_box
+  scale = imgsz / max(frame_width, frame_height)
+  return max(32, math.ceil(max(x2 - x1, y2 - y1) * scale / 32) * 32)
+
+def shift_results(results, frame, x_offset, y_offset):
+  """Moves results computed on a crop back onto the full frame for counting and drawing."""
+  result = results[0]
+  result.orig_img = frame
+  result.orig_shape = frame.shape[:2]
+  data = result.boxes.data.clone()
+  data[:, [0, 2]] += x_offset
+  data[:, [1, 3]] += y_offset
+  result.update(boxes=data)
+  return results
+
+def start_car_counting(video_path, video_writer_path, rect_points, speed_estimation_btn, selected_vehicles,
+                       view_img=True, csv_name="output_csv", csv_dir="./output/csv/",
+                       pipelined=False, queue_size=8, detect_stride=1, roi_crop=False, roi_padding=100,
+                       speed_calibration=None, event_format=None, event_rotate_seconds=None,
+                       event_rotate_bytes=None,
+                       analytics_only=False, backend="pt", frame_callback=None, stop_event=None, regions=None,
+                       metrics=None, live=False, checkpoint_interval=None, resume=False, frame_range=None,
+                       event_sink=None, clips=False, clip_seconds=(2.0, 2.0), video_rotate_seconds=None,
+                       fused_preprocess=False, motion_gate=False,
+                       bin_seconds=None, tracker_cfg="botsort.yaml"):
+  """
+  Runs vehicle counting over one video and returns a summary of the run.
+
+  view_img=False never touches cv2.imshow/waitKey, so this can run on headless machines.
+  pipelined=True runs decode, inference/tracking, annotation and count/encode on separate threads joined
+  by queues of queue_size frames, see pipeline.StagePipeline.
+  detect_stride=N runs the detector on every Nth frame only. The frames in between are grabbed without
+  being decoded and the counter gets boxes interpolated between the two surrounding detections, so the
+  written video holds only the detected frames.
+  roi_crop=True runs the detector only on a crop around the region points padded by roi_padding pixels,
+  boxes are mapped back to full frame coordinates before counting and drawing.
+  speed_calibration={"image_points": [...], "world_points": [...]} maps four points of the resized frame
+  to meters on the road so speeds are real km/h. Speeds always use the video timestamps, not wall-clock time.
+  event_format="csv"/"jsonl"/"sqlite" streams every crossing event to csv_dir while the video runs, rotating
+  files every event_rotate_seconds and/or once they reach event_rotate_bytes, instead of writing object_info
+  once at the end. object_info then stays empty, so memory and checkpoints do not grow with the number of
+  vehicles; use a sink for 24/7 streams.
+  analytics_only=True skips plotting, labels, analytics overlay, display and video encoding, only counts
+  and events are produced; video_writer_path may be None.
+  backend="onnx"/"onnx-int8" runs the detector through onnxruntime, see backends.py. The INT8 model is
+  calibrated on this video the first time it is built. ONNX exports have a fixed input size, so roi_crop
+  then keeps the default inference size.
+  frame_callback(frame, counter, timestamp) is called after every counted frame on the counting thread, frame
+  is the annotated frame or None in analytics_only mode. Setting stop_event (threading.Event) stops the run.
+  regions={"name": [x1, y1, x2, y2, ...]} counts several named lines/regions in one pass instead of
+  rect_points, see regions.RegionSet. The summary then holds per-region counts under "regions".
+  metrics (metrics.Metrics) records capture/resize/track/plot/count/display/write latencies, processed and
+  dropped (stride-skipped) frames and active tracks, and publishes them to its sink while the video runs.
+  live=True treats video_path as a live RTSP/HTTP feed read by livestream.LatestFrameCapture: counting always
+  takes the newest frame and frames arriving while it is busy are dropped, so latency stays bounded. A file is
+  replayed at its native fps as a stand-in camera. detect_stride is ignored and pipeline queues hold one frame,
+  timestamps are seconds since the capture started.
+  checkpoint_interval=N saves a checkpoint to csv_dir/csv_name.ckpt every N seconds, see checkpoint.py.
+  resume=True continues from that checkpoint: the video is seeked to the frame after the last counted one and
+  counts, recorded objects, event files and tracks are restored, so nothing counted before is counted again.
+  The resumed part of the video is written to video_writer_path with a _from<frame> suffix. The checkpoint is
+  removed once the video has been processed completely.
+  frame_range=(start, end) only processes frames start <= n < end, see segments.py.
+  event_sink is any object with write/poll/close (e.g. an events.EventSink) receiving the crossing events,
+  used instead of one built from event_format.
+  The output video is encoded on a background thread (videowriter.AsyncVideoWriter) at the source fps divided
+  by detect_stride and at the size of the counted frames; video_rotate_seconds starts a new file every so many
+  seconds of video time. clips=True writes only clip_seconds=(pre, post) around each counted crossing into
+  a <video_writer_path>_clips/ directory instead of the whole video.
+  fused_preprocess=True resizes each decoded frame once, straight into a reused model input tensor, and maps
+  the boxes back to the 1280-wide frame, see preprocess.Preprocessor. The 1280-wide frame is then only made
+  for drawing and for trackers with camera motion compensation (BoT-SORT), which see the mapped boxes on it.
+  The tracker runs outside the model then, as for "iou". roi_crop keeps its own path and takes precedence.
+  motion_gate=True skips the detector and tracker while nothing moves around the region points, see
+  motion.MotionGate. Idle frames are not counted, shown or written and the summary reports them as
+  "idle_frames". Vehicles standing still stay tracked across an idle gap and keep their ids, only lost tracks
+  are aged by the length of the gap.
+  bin_seconds=(60, 300, 900) aggregates in/out counts per class (and region) in bins of those widths of video
+  time and writes each bin to csv_dir/<csv_name>_bins_* in the event_format (csv by default) as soon as it
+  closes, see bins.TimeBins. Bins also close during motion-gated idle frames.
+  tracker_cfg selects the tracker: an ultralytics tracker yaml ("botsort.yaml", "bytetrack.yaml" or a tuned
+  copy) run by model.track, or "iou" for the vectorized iou_tracker.IOUTracker run on model.predict output.
+  With fused_preprocess every tracker runs on model.predict output.
+  """
   print(f"Start counting cars path at {video_path}")
   while not video_path:
     pass
 
-  get_video_info(video_path)
-  cap = cv2.VideoCapture(video_path)
+  cap = None
+  if not live:
+    get_video_info(video_path)
+    cap = cv2.VideoCapture(video_path)
 
-  assert cap.isOpened(), "Error reading video file" 
+    assert cap.isOpened(), "Error reading video file" 
   
-  region_points = [(rect_points[i], rect_points[i+1]) for i in range(0, len(rect_points), 2)]
+  region_points = parse_region_points(rect_points)
   print(region_points)
+  if regions:
+    regions = {name: parse_region_points(points) for name, points in regions.items()}
+    # The detector crop has to cover every region
+    region_points = [point for points in regions.values() for point in points]
   
   window_width = 1280
-  window_height = 720
   
-  video_writer = cv2.VideoWriter(video_writer_path,
-              cv2.VideoWriter_fourcc(*'mp4v'),
-              10,
-              (window_width, window_height))
+  if analytics_only:
+    view_img = False
+  checkpoint_path = os.path.join(csv_dir, f"{csv_name}.ckpt")
+  saved = checkpoint.load_checkpoint(checkpoint_path) if resume else None
+  if saved is not None:
+    if saved["video_path"] != video_path:
+      raise ValueError(f"Checkpoint {checkpoint_path} belongs to {saved['video_path']}, not {video_path}")
+    print(f"Resuming {video_path} from frame {saved['next_frame']}")
+    if video_writer_path:
+      root, ext = os.path.splitext(video_writer_path)
+      video_writer_path = f"{root}_from{saved['next_frame']}{ext}"
   #add counter
-  counter = tracker.ObjectCounter()
-  counter.set_args(view_img=True,
-          reg_pts=region_points,
-          classes_names=model.names,
-          draw_tracks=False,
-          speed_estimation=speed_estimation_btn,)
+  detector = get_model(backend, [video_path])
+  counter = create_counter(region_points, speed_estimation_btn, view_img, speed_calibration, detector.names, regions)
+  counter.metrics = metrics
+  timer = time.perf_counter
+  fps = cap.get(cv2.CAP_PROP_FPS) if cap is not None else None
+  fused = fused_preprocess and not roi_crop
+  # The ultralytics trackers run inside model.track, "iou" runs on its own after model.predict. The fused path
+  # predicts on a letterboxed tensor, so every tracker runs on its own there and sees the boxes and the frame
+  # at working size, model.track would hand the tensor to BoT-SORT's camera motion compensation.
+  standalone_tracker = None
+  if tracker_cfg == "iou" or fused:
+    from tracking import apply_tracker, create_tracker, track_low_thresh, uses_frame
+
+    standalone_tracker = create_tracker(tracker_cfg, frame_rate=int(round(fps or 30)))
+  if event_format:
+    event_sink = events.create_event_sink(event_format, csv_dir, csv_name, rotate_seconds=event_rotate_seconds,
+                                          rotate_bytes=event_rotate_bytes)
+  counter.event_sink = event_sink
+  bin_sink = None
+  if bin_seconds:
+    bin_sink = events.create_event_sink(event_format or "csv", csv_dir, f"{csv_name}_bins", flush_records=1,
+                                        fields=bins.BIN_FIELDS, table="bins")
+    counter.bins = bins.TimeBins(bin_seconds, bin_sink)
   
   all_data = counter.object_info
   
-  
-  while cap.isOpened():
-    success, frame = cap.read()
-    
-    (h, w) = frame.shape[:2]
-    
-    if success:
-      
-      # Resize frame based on desired output width or maintain aspect ratio
-      if window_width:
-        r = window_width / float(w)  # Use desired width for resizing
-      else:
-          # Maintain aspect ratio for resizing
-          max_dim = 1024  # Adjust as needed to limit maximum dimension
-          if max(h, w) > max_dim:
-            r = max_dim / float(max(h, w))
-          else:
-            r = 1  # No resizing needed if both dimensions are within limit
-            
-      dim = (int(w * r), int(h * r))
-      resized_frame = cv2.resize(frame, dim, interpolation=cv2.INTER_AREA)
-      results = model.track(resized_frame, persist=True, conf=0.5, classes= selected_vehicles)  # Adjust confidence/iou thresholds
-      annotated_frame = results[0].plot(labels=False)
-
-      time_info = get_time_info(cap)
-      time_text = f"{time_info[0]}:{time_info[1]}:{time_info[2]}"
-      cv2.putText(annotated_frame, time_text, (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-      
-      frame = counter.start_counting(annotated_frame, results, time_info)
-      video_writer.write(frame)
-
-      if cv2.waitKey(1) & 0xFF == ord("q") or cv2.getWindowProperty("Vehicle counting", cv2.WND_PROP_VISIBLE) < 1:  #break when hit "q" button
+  frame_count = 0
+
+  prev_tracks = None
+  crop = None
+  preprocessor = None
+  start_frame, end_frame = frame_range or (0, None)
+  if start_frame:
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+  # Detected frames are numbered so a checkpoint requested at detection is saved once that frame is counted,
+  # the detect stage can be ahead of counting when pipelined
+  detected_frames = counted_frames = 0
+  checkpoint_requests = deque()
+  # Video positions of the frames handed to detection, the counting stage pops them in the same order
+  frame_positions = deque()
+  next_frame = start_frame
+  gate = None
+  idle_gap = 0
+  # Timestamp of the first frame after each idle gap -> frames the gap lasted, the detect stage ages the lost
+  # tracks by that many frames before detecting it
+  idle_gaps = {}
+  last_checkpoint = time.monotonic()
+  reached_end = False
+  if saved is not None:
+    counter.load_state_dict(saved["counter"])
+    if event_sink is not None and saved["events"] is not None:
+      event_sink.load_state_dict(saved["events"])
+    if bin_sink is not None and saved.get("bins") is not None:
+      bin_sink.load_state_dict(saved["bins"])
+    if saved["tracker"] is not None:
+      trackers = checkpoint.restore_tracker(detector, saved["tracker"], saved["frame_shape"],
+                                            standalone=standalone_tracker is not None)
+      if standalone_tracker is not None:
+        standalone_tracker = trackers[0]
+    prev_tracks = saved["prev_tracks"]
+    detected_frames = counted_frames = saved["detected_frames"]
+    if not live:
+      start_frame = next_frame = saved["next_frame"]
+      cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+  def save_checkpoint(tracker_state, frame_shape):
+    checkpoint.save_checkpoint(checkpoint_path, {
+      "video_path": video_path,
+      # Frames after the last counted one are read again
+      "next_frame": next_frame,
+      "detected_frames": counted_frames,
+      "frame_shape": frame_shape,
+      "prev_tracks": prev_tracks,
+      "counter": counter.state_dict(),
+      "events": event_sink.state_dict() if event_sink is not None else None,
+      "bins": bin_sink.state_dict() if bin_sink is not None else None,
+      "tracker": tracker_state,
+    })
+
+  def resize_working(frame):
+    start = timer() if metrics is not None else 0.0
+    resized_frame = resize_frame(frame, window_width)
+    if metrics is not None:
+      metrics.record("resize", timer() - start)
+    return resized_frame
+
+  def prepare(frame):
+    """Working-size frame, or the decoded frame itself when the detect stage preprocesses it."""
+    return frame if fused else resize_working(frame)
+
+  def track(source, frame=None, to_window=None, **kwargs):
+    """
+    model.track with the configured tracker, or detection followed by the standalone tracker.
+
+    to_window maps the predicted boxes to the working-size frame before the standalone tracker runs, frame is
+    that BGR frame for camera motion compensation.
+    """
+    if standalone_tracker is None:
+      return detector.track(source, persist=True, tracker=tracker_cfg, conf=0.5, classes= selected_vehicles, verbose=view_img, **kwargs)  # Adjust confidence/iou thresholds
+    # Weak boxes are kept for the tracker's low-score round and only dropped after association
+    results = detector.predict(source, conf=track_low_thresh(standalone_tracker), classes= selected_vehicles,
+                               verbose=view_img, **kwargs)
+    if to_window is not None:
+      results = to_window(results)
+    return [apply_tracker(standalone_tracker, results[0], frame, conf=0.5)]
+
+  def motion_idle(frame, timestamp):
+    """True while the motion gate holds the detector off for this frame."""
+    nonlocal gate, idle_gap
+    if not motion_gate:
+      return False
+    if gate is None:
+      gate = motion.MotionGate(region_points, frame.shape, window_width)
+    start = timer() if metrics is not None else 0.0
+    moving = gate.update(frame)
+    if metrics is not None:
+      metrics.record("motion", timer() - start)
+    if not moving:
+      idle_gap += 1
+      if metrics is not None:
+        metrics.count("frames_idle")
+      return True
+    if idle_gap:
+      idle_gaps[timestamp] = idle_gap
+      idle_gap = 0
+    return False
+
+  # Frame loop stages: decode -> inference/tracking -> annotate -> count/encode
+  def decode_frames():
+    nonlocal reached_end
+    frame_idx = start_frame
+    skipped_times = []
+    while cap.isOpened() and (end_frame is None or frame_idx < end_frame):
+      if frame_idx % detect_stride:
+        # Frames between detections are only grabbed, never decoded or resized
+        if not cap.grab():
+          reached_end = True
+          break
+        skipped_times.append(get_frame_timestamp(cap, frame_idx, fps))
+        frame_idx += 1
+        if metrics is not None:
+          metrics.count("frames_dropped")
+        continue
+      start = timer() if metrics is not None else 0.0
+      success, frame = cap.read()
+      if not success:
+        # Break the loop if the end of the video is reached
+        reached_end = True
         break
+      if metrics is not None:
+        metrics.record("capture", timer() - start)
+      # Time is read together with the frame so it stays correct when the stages run on other threads
+      frame, timestamp = prepare(frame), get_frame_timestamp(cap, frame_idx, fps)
+      if motion_idle(frame, timestamp):
+        # Idle frames still flow through the stages without a frame, so time bins close while nothing moves
+        frame = None
+      frame_positions.append(frame_idx)
+      yield frame, timestamp, skipped_times
+      frame_idx += 1
+      skipped_times = []
+    if end_frame is not None and frame_idx >= end_frame:
+      reached_end = True
+
+  def decode_live_frames():
+    dropped = 0
+    while True:
+      item = live_source.read(timeout=0.5)
+      if item is None:
+        if live_source.finished or (stop_event is not None and stop_event.is_set()):
+          break
+        continue
+      frame, timestamp = item
+      if metrics is not None and live_source.dropped > dropped:
+        metrics.count("frames_dropped", live_source.dropped - dropped)
+        dropped = live_source.dropped
+      frame = prepare(frame)
+      yield None if motion_idle(frame, timestamp) else frame, timestamp, []
+
+  def detect(item):
+    nonlocal crop, preprocessor, detected_frames, last_checkpoint
+    frame, timestamp, skipped_times = item
+    if frame is None:
+      return None, timestamp, skipped_times
+    if timestamp in idle_gaps:
+      motion.age_lost_tracks(detector, idle_gaps.pop(timestamp),
+                             [standalone_tracker] if standalone_tracker is not None else None)
+    if fused:
+      if preprocessor is None:
+        import preprocess
+
+        preprocessor = preprocess.Preprocessor(frame.shape, window_width, backends.IMGSZ, square=backend != "pt")
+      window_frame = None if analytics_only and not uses_frame(standalone_tracker) else resize_working(frame)
+    start = timer() if metrics is not None else 0.0
+    if fused:
+      results = track(preprocessor(frame), window_frame, lambda results: preprocessor.to_window(results, window_frame))
+    elif roi_crop:
+      if crop is None:
+        (h, w) = frame.shape[:2]
+        crop_box = roi_crop_box(region_points, w, h, roi_padding)
+        crop = crop_box, roi_imgsz(crop_box, w, h) if backend == "pt" else backends.IMGSZ
+      (x1, y1, x2, y2), imgsz = crop
+      results = track(frame[y1:y2, x1:x2], imgsz=imgsz)
+      results = shift_results(results, frame, x1, y1)
+    else:
+      results = track(frame)
+    if metrics is not None:
+      metrics.record("track", timer() - start)
+    detected_frames += 1
+    if checkpoint_interval and time.monotonic() - last_checkpoint >= checkpoint_interval:
+      # The tracker is snapshotted here, right after this frame, and saved with the counter once it is counted
+      last_checkpoint = time.monotonic()
+      checkpoint_requests.append((detected_frames, checkpoint.tracker_state(
+        detector, [standalone_tracker] if standalone_tracker is not None else None), frame.shape))
+    return results, timestamp, skipped_times
+
+  def annotate(item):
+    results, timestamp, skipped_times = item
+    if results is None:
+      return None, None, None, timestamp, skipped_times
+    time_info = format_time_info(timestamp * 1000)
+    start = timer() if metrics is not None else 0.0
+    annotated_frame = None if analytics_only else annotate_frame(results, time_info)
+    if metrics is not None and not analytics_only:
+      metrics.record("plot", timer() - start)
+    return annotated_frame, results, time_info, timestamp, skipped_times
+
+  def count_and_write(item):
+    nonlocal frame_count, prev_tracks, counted_frames, next_frame
+    annotated_frame, results, time_info, timestamp, skipped_times = item
+    if results is None:
+      # Held back by the motion gate, nothing is counted or written but bins still close on time
+      if counter.bins is not None:
+        counter.bins.advance(timestamp)
+      if frame_positions:
+        next_frame = frame_positions.popleft() + 1
+      if event_sink is not None:
+        event_sink.poll()
+      if metrics is not None:
+        metrics.poll()
+      if stop_event is not None and stop_event.is_set():
+        return False
+      return
+    counts_before = counter.in_counts + counter.out_counts
+    if detect_stride > 1:
+      # Feed the counter the boxes of the skipped frames so crossings inside the gap are not missed
+      tracks = counter.unpack_tracks(results)
+      if prev_tracks is not None and tracks is not None and skipped_times:
+        for skipped_tracks, skipped_time in zip(tracker.interpolate_tracks(prev_tracks, tracks, len(skipped_times)), skipped_times):
+          counter.count_tracks(*skipped_tracks, format_time_info(skipped_time * 1000), skipped_time)
+      prev_tracks = tracks
+    frame = counter.start_counting(annotated_frame, results, time_info, timestamp)
+    if video_writer is not None:
+      start = timer() if metrics is not None else 0.0
+      if clips and counter.in_counts + counter.out_counts != counts_before:
+        video_writer.trigger(timestamp)
+      video_writer.write(frame, timestamp)
+      if metrics is not None:
+        metrics.record("write", timer() - start)
+    frame_count += 1
+    counted_frames += 1
+    if frame_positions:
+      next_frame = frame_positions.popleft() + 1
+    if checkpoint_requests and checkpoint_requests[0][0] == counted_frames:
+      _, tracker_state, frame_shape = checkpoint_requests.popleft()
+      save_checkpoint(tracker_state, frame_shape)
+    if event_sink is not None:
+      event_sink.poll()
+    if metrics is not None:
+      metrics.count("frames_processed")
+      metrics.poll()
+    if frame_callback is not None:
+      frame_callback(frame, counter, timestamp)
+    if stop_event is not None and stop_event.is_set():
+      return False
+
+    if view_img and (cv2.waitKey(1) & 0xFF == ord("q") or cv2.getWindowProperty("Vehicle counting", cv2.WND_PROP_VISIBLE) < 1):  #break when hit "q" button
+      return False
+
+  live_source = None
+  if live:
+    # Started only now so frames are not dropped while the model loads
+    live_source = livestream.LatestFrameCapture(video_path)
+    queue_size = 1
+  frames = decode_live_frames() if live else decode_frames()
+  video_writer = None
+  if not analytics_only:
+    # The written video holds every detect_stride-th frame. Live frames are dropped at random while counting is
+    # busy, so they are placed by timestamp to keep playback in real time.
+    output_fps = live_source.fps if live else (fps or 30) / detect_stride
+    if clips:
+      video_writer = videowriter.ClipRecorder(os.path.splitext(video_writer_path)[0] + "_clips", output_fps,
+                                              *clip_seconds, timed=live)
+    else:
+      video_writer = videowriter.AsyncVideoWriter(video_writer_path, output_fps, rotate_seconds=video_rotate_seconds,
+                                                  timed=live)
+  start_time = time.perf_counter()
+  try:
+    if pipelined:
+      pipeline.StagePipeline(frames, [detect, annotate], count_and_write, queue_size=queue_size).run()
     else:
-      # Break the loop if the end of the video is reached
-      break
+      for item in frames:
+        if count_and_write(annotate(detect(item))) is False:
+          break
+  finally:
+    if live_source is not None:
+      live_source.stop()
+    # Events recorded so far are kept even if processing fails half way
+    if event_sink is not None:
+      event_sink.close()
+    if bin_sink is not None:
+      counter.bins.close()
+      bin_sink.close()
+    if metrics is not None:
+      metrics.close()
+    if video_writer is not None:
+      video_writer.release()
 
-  cap.release()
-  cv2.destroyAllWindows()
+  elapsed = time.perf_counter() - start_time
+  if cap is not None:
+    cap.release()
+  if checkpoint_interval and reached_end and not (stop_event is not None and stop_event.is_set()) \
+      and os.path.exists(checkpoint_path):
+    os.remove(checkpoint_path)
+    for sink in (event_sink, bin_sink):
+      if hasattr(sink, "remove_manifest"):
+        sink.remove_manifest()
+  if view_img:
+    cv2.destroyAllWindows()
   
-  csv_writer = csvHandler()
-  csv_writer.export_to_csv(all_data,"output_csv")
\ No newline at end of file
+  if event_sink is None:
+    csv_writer = csvHandler()
+    csv_writer.export_to_csv(all_data, csv_name, csv_dir)
+
+  summary = {
+    "video_path": video_path,
+    "frames": frame_count,
+    "seconds": elapsed,
+    "fps": frame_count / elapsed if elapsed > 0 else 0.0,
+    "in_counts": counter.in_counts,
+    "out_counts": counter.out_counts,
+    "class_counts": dict(counter.class_counts),
+  }
+  if gate is not None:
+    summary["idle_frames"] = gate.skipped
+  if counter.regions is not None:
+    summary["regions"] = counter.regions.summary()
+  if live_source is not None:
+    summary["captured_frames"] = live_source.captured
+    summary["dropped_frames"] = live_source.dropped
+    summary["reconnects"] = live_source.reconnects
+  return summary
@@ -0,0 +1,68 @@
+"""
+Checkpoints of a running start_car_counting job, so a crash does not mean starting a long video over.
+
+A checkpoint holds the position of the last counted frame, the ObjectCounter state (counts, recorded objects,
+TrackStore), the write position of the event sink and the ultralytics tracker with its track id counter.
+It is pickled to a temporary file and moved into place, so an interrupted write leaves the previous
+checkpoint intact.
+"""
+
+import os, pickle
+
+import numpy as np
+
+
+def save_checkpoint(path, state):
+    """Atomically replaces the checkpoint at `path` with `state`."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    """The saved state, None when there is no checkpoint."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as file:
+        return pickle.load(file)
+
+
+def tracker_state(detector, trackers=None):
+    """
+    Pickled snapshot of the model's trackers, or of `trackers` run outside the model, and the global track id
+    counter.
+
+    Returns None before the first track call or when the tracker holds objects that cannot be pickled
+    (e.g. OpenCV feature detectors of some GMC methods), tracks then restart after a resume.
+    """
+    from ultralytics.trackers.basetrack import BaseTrack
+
+    if trackers is None:
+        trackers = getattr(getattr(detector, "predictor", None), "trackers", None)
+    if trackers is None:
+        return None
+    try:
+        return pickle.dumps({"trackers": trackers, "next_id": BaseTrack._count})
+    except (pickle.PicklingError, TypeError) as error:
+        print(f"Tracker state not saved, tracks restart on resume: {error}")
+        return None
+
+
+def restore_tracker(detector, state, frame_shape, standalone=False):
+    """
+    Sets up the model's predictor with one track call on a blank frame, then swaps in the saved trackers.
+
+    With standalone=True the trackers were run outside the model and are only returned.
+    """
+    from ultralytics.trackers.basetrack import BaseTrack
+
+    saved = pickle.loads(state)
+    if not standalone:
+        detector.track(np.zeros(frame_shape, dtype=np.uint8), persist=True, verbose=False)
+        detector.predictor.trackers = saved["trackers"]
+    BaseTrack._count = saved["next_id"]
+    return saved["trackers"]
@@ -0,0 +1,248 @@
+"""
+Streaming sinks for counting events.
+
+ObjectCounter hands every crossing to a sink as soon as it happens. Records are buffered in memory and
+flushed every `flush_interval` seconds or `flush_records` records, so a crash loses at most one buffer.
+Output files are rotated by size and/or age.
+
+Example:
+    sink = create_event_sink("jsonl", "./output/events/", "camera1", rotate_seconds=3600)
+    counter.set_args(..., event_sink=sink)
+    ...
+    sink.close()
+"""
+
+import csv, datetime, json, os, sqlite3, time
+
+EVENT_FIELDS = ["track_id", "class_name", "direction", "speed", "time_data", "timestamp", "region"]
+# SQLite column types, fields not listed get NUMERIC affinity
+COLUMN_TYPES = {"track_id": "INTEGER", "class_name": "TEXT", "direction": "TEXT", "speed": "REAL",
+                "time_data": "TEXT", "timestamp": "REAL", "region": "TEXT"}
+
+
+class EventSink:
+    """
+    Buffered, rotating writer base class. Subclasses implement the file format.
+
+    Args:
+        output_dir (str): Directory the event files are written to.
+        name (str): File name prefix, the open time and the format extension are appended.
+        flush_interval (float): Seconds after which buffered records are written out.
+        flush_records (int): Number of buffered records that triggers a write.
+        rotate_bytes (int): Start a new file once the current one reaches this size, None disables.
+        rotate_seconds (float): Start a new file once the current one is this old, None disables.
+        fields (list): Record fields written, in column order.
+        table (str): SQLite table name.
+    """
+
+    extension = ""
+
+    def __init__(self, output_dir, name, flush_interval=5.0, flush_records=100, rotate_bytes=None,
+                 rotate_seconds=None, fields=EVENT_FIELDS, table="events"):
+        self.output_dir = output_dir
+        self.name = name
+        self.flush_interval = flush_interval
+        self.flush_records = flush_records
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.fields = fields
+        self.table = table
+        self.buffer = []
+        self.path = None
+        self.paths = []
+        self.manifest = None  # list of the files opened since the first state_dict, see load_state_dict
+        self.opened_at = 0.0
+        self.last_flush = time.monotonic()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write(self, record):
+        """Buffers one event record, flushing when the buffer is full or the flush interval has passed."""
+        self.buffer.append(record)
+        if len(self.buffer) >= self.flush_records:
+            self.flush()
+        else:
+            self.poll()
+
+    def poll(self):
+        """Flushes the buffer if the flush interval has passed, cheap enough to call every frame."""
+        if self.buffer and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        if self.path is None or self._should_rotate():
+            self._rotate()
+        self._write_records(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        if self.path is not None:
+            self._close_file()
+            self.path = None
+
+    def state_dict(self):
+        """Flushes and returns the files written so far and the write position in the current one."""
+        self.flush()
+        if self.manifest is None:
+            # From now on every file this sink opens is listed, so a resume knows exactly which ones are its own
+            self.manifest = os.path.join(self.output_dir, f".{self.name}_{os.getpid()}_{time.time_ns()}.paths")
+            self._write_manifest()
+        return {"paths": list(self.paths), "path": self.path,
+                "position": self._position() if self.path is not None else None, "manifest": self.manifest}
+
+    def load_state_dict(self, state):
+        """
+        Continues writing from a state_dict, dropping everything written after it was taken.
+
+        The current file is cut back to the saved position and the files the interrupted run rotated into
+        afterwards (listed in its manifest) are removed, so events replayed after a resume are not recorded
+        twice. Other files in the directory, e.g. of other runs with the same name, are never touched.
+        """
+        self.manifest = state.get("manifest")
+        if self.manifest is not None and os.path.exists(self.manifest):
+            with open(self.manifest) as file:
+                for path in file.read().splitlines():
+                    if path not in state["paths"] and os.path.exists(path):
+                        os.remove(path)
+        self.paths = list(state["paths"])
+        if self.manifest is not None:
+            self._write_manifest()
+        if state["path"] is not None:
+            self.path = state["path"]
+            self.opened_at = time.monotonic()
+            self._reopen_file(self.path, state["position"])
+
+    def remove_manifest(self):
+        """Deletes the file list kept for resuming, once no checkpoint refers to it anymore."""
+        if self.manifest is not None and os.path.exists(self.manifest):
+            os.remove(self.manifest)
+        self.manifest = None
+
+    def _write_manifest(self):
+        with open(self.manifest, "w") as file:
+            file.write("".join(f"{path}\n" for path in self.paths))
+
+    def _should_rotate(self):
+        if self.rotate_seconds is not None and time.monotonic() - self.opened_at >= self.rotate_seconds:
+            return True
+        return self.rotate_bytes is not None and os.path.getsize(self.path) >= self.rotate_bytes
+
+    def _rotate(self):
+        if self.path is not None:
+            self._close_file()
+        current_datetime = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        path = os.path.join(self.output_dir, f"{self.name}_{current_datetime}{self.extension}")
+        suffix = 1
+        while path in self.paths or os.path.exists(path):
+            path = os.path.join(self.output_dir, f"{self.name}_{current_datetime}_{suffix}{self.extension}")
+            suffix += 1
+        self.path = path
+        self.paths.append(path)
+        if self.manifest is not None:
+            with open(self.manifest, "a") as file:
+                file.write(f"{path}\n")
+        self.opened_at = time.monotonic()
+        self._open_file(path)
+
+    def _open_file(self, path):
+        raise NotImplementedError
+
+    def _write_records(self, records):
+        raise NotImplementedError
+
+    def _close_file(self):
+        raise NotImplementedError
+
+    def _position(self):
+        raise NotImplementedError
+
+    def _reopen_file(self, path, position):
+        raise NotImplementedError
+
+
+class CsvEventSink(EventSink):
+    extension = ".csv"
+
+    def _open_file(self, path):
+        self.file = open(path, mode="w", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fields, extrasaction="ignore")
+        self.writer.writeheader()
+
+    def _write_records(self, records):
+        self.writer.writerows(records)
+        self.file.flush()
+
+    def _close_file(self):
+        self.file.close()
+
+    def _position(self):
+        return self.file.tell()
+
+    def _reopen_file(self, path, position):
+        with open(path, "r+") as file:
+            file.truncate(position)
+        self.file = open(path, mode="a", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fields, extrasaction="ignore")
+
+
+class JsonlEventSink(EventSink):
+    extension = ".jsonl"
+
+    def _open_file(self, path):
+        self.file = open(path, mode="w")
+
+    def _write_records(self, records):
+        self.file.write("".join(json.dumps(record) + "\n" for record in records))
+        self.file.flush()
+
+    def _close_file(self):
+        self.file.close()
+
+    def _position(self):
+        return self.file.tell()
+
+    def _reopen_file(self, path, position):
+        with open(path, "r+") as file:
+            file.truncate(position)
+        self.file = open(path, mode="a")
+
+
+class SqliteEventSink(EventSink):
+    extension = ".sqlite"
+
+    def _open_file(self, path):
+        self.connection = sqlite3.connect(path)
+        columns = ", ".join(f"{field} {COLUMN_TYPES.get(field, 'NUMERIC')}" for field in self.fields)
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS {self.table} ({columns})")
+        self.connection.commit()
+
+    def _write_records(self, records):
+        self.connection.executemany(
+            f"INSERT INTO {self.table} VALUES ({', '.join('?' * len(self.fields))})",
+            [tuple(record.get(field) for field in self.fields) for record in records],
+        )
+        self.connection.commit()
+
+    def _close_file(self):
+        self.connection.close()
+
+    def _position(self):
+        return self.connection.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {self.table}").fetchone()[0]
+
+    def _reopen_file(self, path, position):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(f"DELETE FROM {self.table} WHERE rowid > ?", (position,))
+        self.connection.commit()
+
+
+EVENT_SINKS = {"csv": CsvEventSink, "jsonl": JsonlEventSink, "sqlite": SqliteEventSink}
+
+
+def create_event_sink(event_format, output_dir, name, **kwargs):
+    """Builds the sink for `event_format` ("csv", "jsonl" or "sqlite"), extra kwargs go to EventSink."""
+    if event_format not in EVENT_SINKS:
+        raise ValueError(f"Unknown event format '{event_format}', expected one of {list(EVENT_SINKS)}")
+    return EVENT_SINKS[event_format](output_dir, name, **kwargs)
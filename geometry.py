@@ -0,0 +1,15 @@
+"""
+Box geometry shared by the backend comparison and the trackers, on plain numpy arrays.
+"""
+
+import numpy as np
+
+
+def box_iou(a, b):
+    """Pairwise IoU of two (N, 4) and (M, 4) xyxy arrays."""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
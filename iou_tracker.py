@@ -0,0 +1,163 @@
+"""
+Lean ByteTrack-style tracker: IoU association only, all track state in numpy arrays.
+
+Fixed cameras counting whole vehicles do not need appearance features, camera motion compensation or a
+Kalman filter per track. IOUTracker keeps every track as one row of a few arrays, predicts boxes with a
+constant velocity and associates in two ByteTrack rounds solved with lapx:
+
+    1. high confidence detections against all tracks, lost ones included;
+    2. low confidence detections against the tracks still unmatched that were seen in the previous frame.
+
+Unmatched high confidence detections start new tracks, which are reported from their second match on.
+update() returns the same [x1, y1, x2, y2, track_id, score, cls, idx] rows as the ultralytics trackers, so
+it plugs into tracking.apply_tracker.
+
+Example:
+    python benchmark.py --stages tracking --trackers botsort.yaml bytetrack.yaml iou
+"""
+
+import numpy as np
+
+try:
+    import lap
+except ImportError:
+    from ultralytics.utils.checks import check_requirements
+
+    check_requirements("lapx>=0.5.2")
+    import lap
+
+from geometry import box_iou
+
+
+def linear_assignment(cost, thresh):
+    """
+    Minimum cost matching with pairs above `thresh` left out.
+
+    Returns:
+        (tuple): matched rows, matched columns, unmatched rows, unmatched columns.
+    """
+    if cost.size == 0:
+        empty = np.empty(0, dtype=int)
+        return empty, empty, np.arange(cost.shape[0]), np.arange(cost.shape[1])
+    _, x, y = lap.lapjv(cost, extend_cost=True, cost_limit=thresh)
+    rows = np.flatnonzero(x >= 0)
+    return rows, x[rows], np.flatnonzero(x < 0), np.flatnonzero(y < 0)
+
+
+class IOUTracker:
+    """
+    Two-round IoU tracker with constant velocity prediction.
+
+    Args:
+        track_high_thresh (float): Score from which a detection is matched in the first round.
+        track_low_thresh (float): Score below which a detection is ignored.
+        new_track_thresh (float): Score an unmatched detection needs to start a track.
+        match_thresh (float): Highest 1 - IoU cost accepted in the first round, the second uses 0.5.
+        track_buffer (int): Frames at 30 fps a lost track is kept for re-association.
+        frame_rate (int): Frame rate of the updates.
+    """
+
+    def __init__(self, track_high_thresh=0.5, track_low_thresh=0.1, new_track_thresh=0.6, match_thresh=0.8,
+                 track_buffer=30, frame_rate=30):
+        self.track_high_thresh = track_high_thresh
+        self.track_low_thresh = track_low_thresh
+        self.new_track_thresh = new_track_thresh
+        self.match_thresh = match_thresh
+        self.max_time_lost = int(frame_rate / 30.0 * track_buffer)
+        self.frame_id = 0
+        self.next_id = 1
+        self.clear_tracks()
+
+    def clear_tracks(self):
+        """Drops all tracks, ids keep counting up."""
+        self.boxes = np.empty((0, 4))
+        self.velocity = np.empty((0, 4))  # box change per frame
+        self.ids = np.empty(0, dtype=int)
+        self.scores = np.empty(0)
+        self.classes = np.empty(0)
+        self.last_seen = np.empty(0, dtype=int)
+        self.hits = np.empty(0, dtype=int)
+
+    def age_lost(self, frames):
+        """Makes the lost tracks `frames` frames older, for frames the tracker was not run on."""
+        lost = self.last_seen < self.frame_id
+        self.last_seen[lost] -= frames
+        self._select(self.frame_id - self.last_seen <= self.max_time_lost)
+
+    def update(self, results, img=None):
+        """
+        Associates one frame of detections.
+
+        Args:
+            results (ultralytics.engine.results.Boxes): Detections, any object with xyxy, conf and cls numpy
+                arrays will do.
+            img (ndarray): Unused, kept for the ultralytics tracker interface.
+
+        Returns:
+            (ndarray): (N, 8) float32 [x1, y1, x2, y2, track_id, score, cls, detection index] of the confirmed
+                tracks matched in this frame.
+        """
+        self.frame_id += 1
+        det_boxes = np.asarray(results.xyxy, dtype=float).reshape(-1, 4)
+        det_scores = np.asarray(results.conf, dtype=float).reshape(-1)
+        det_classes = np.asarray(results.cls, dtype=float).reshape(-1)
+
+        gap = (self.frame_id - self.last_seen)[:, None]
+        predicted = self.boxes + self.velocity * gap
+        high = np.flatnonzero(det_scores >= self.track_high_thresh)
+        low = np.flatnonzero((det_scores > self.track_low_thresh) & (det_scores < self.track_high_thresh))
+
+        # Round 1: confident detections against every track
+        rows, cols, unmatched, unmatched_high = linear_assignment(
+            1 - box_iou(predicted, det_boxes[high]), self.match_thresh)
+        track_idx, det_idx = [rows], [high[cols]]
+
+        # Round 2: weak detections keep the tracks that were visible in the previous frame alive
+        recent = unmatched[self.last_seen[unmatched] == self.frame_id - 1]
+        rows, cols, _, _ = linear_assignment(1 - box_iou(predicted[recent], det_boxes[low]), 0.5)
+        track_idx.append(recent[rows])
+        det_idx.append(low[cols])
+        track_idx, det_idx = np.concatenate(track_idx), np.concatenate(det_idx)
+
+        # Matched tracks take the detection, velocity is smoothed over the frames since the last match
+        new_velocity = (det_boxes[det_idx] - self.boxes[track_idx]) / gap[track_idx]
+        self.velocity[track_idx] = np.where((self.hits[track_idx] > 1)[:, None],
+                                            0.5 * self.velocity[track_idx] + 0.5 * new_velocity, new_velocity)
+        self.boxes[track_idx] = det_boxes[det_idx]
+        self.scores[track_idx] = det_scores[det_idx]
+        self.classes[track_idx] = det_classes[det_idx]
+        self.last_seen[track_idx] = self.frame_id
+        self.hits[track_idx] += 1
+
+        # Tracks never confirmed are dropped on their first miss, lost ones after max_time_lost frames
+        missed = self.last_seen != self.frame_id
+        keep = ~((missed & (self.hits < 2)) | (self.frame_id - self.last_seen > self.max_time_lost))
+        output = track_idx[self.hits[track_idx] >= 2]
+        output_rows = np.concatenate([self.boxes[output], self.ids[output, None], self.scores[output, None],
+                                      self.classes[output, None], det_idx[self.hits[track_idx] >= 2, None]], axis=1)
+        self._select(keep)
+
+        # New tracks from confident detections nobody claimed, confirmed right away in the first frame
+        new = high[unmatched_high]
+        new = new[det_scores[new] >= self.new_track_thresh]
+        if len(new):
+            new_ids = np.arange(self.next_id, self.next_id + len(new))
+            self.next_id += len(new)
+            hits = 2 if self.frame_id == 1 else 1
+            self.boxes = np.concatenate([self.boxes, det_boxes[new]])
+            self.velocity = np.concatenate([self.velocity, np.zeros((len(new), 4))])
+            self.ids = np.concatenate([self.ids, new_ids])
+            self.scores = np.concatenate([self.scores, det_scores[new]])
+            self.classes = np.concatenate([self.classes, det_classes[new]])
+            self.last_seen = np.concatenate([self.last_seen, np.full(len(new), self.frame_id)])
+            self.hits = np.concatenate([self.hits, np.full(len(new), hits)])
+            if hits == 2:
+                output_rows = np.concatenate([output_rows, np.concatenate(
+                    [det_boxes[new], new_ids[:, None], det_scores[new, None], det_classes[new, None], new[:, None]],
+                    axis=1)])
+        return output_rows.astype(np.float32)
+
+    def _select(self, keep):
+        self.boxes, self.velocity = self.boxes[keep], self.velocity[keep]
+        self.ids, self.scores, self.classes = self.ids[keep], self.scores[keep], self.classes[keep]
+        self.last_seen, self.hits = self.last_seen[keep], self.hits[keep]
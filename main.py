@@ -1,11 +1,17 @@
+import time
+# Set CARCOUNT_STARTUP_TIMING=1 to print the time from here to the window and to the loaded model
+startup_time = time.perf_counter()
+
 import cv2
-import os, sys
+import os, sys, threading
 from datetime import datetime
 from PySide6.QtWidgets import (QApplication, QMainWindow, QLabel, QPushButton, QWidget, QFileDialog, 
-QDialog, QMessageBox, QGridLayout, QVBoxLayout, QHBoxLayout,QCheckBox ,QRadioButton, QMenuBar, QMenu, QSplashScreen)
+QDialog, QMessageBox, QGridLayout, QVBoxLayout, QHBoxLayout,QCheckBox ,QRadioButton, QMenuBar, QMenu, QSplashScreen,
+QProgressBar, QSlider)
 from PySide6.QtGui import QPixmap, QImage, QPainter, QPen, Qt, QAction, QFont, QIcon
-from PySide6.QtCore import QPoint, QSize
-from carCount import RectPointsHandler, VideoHandler, start_car_counting
+from PySide6.QtCore import QPoint, QSize, QThread, Signal
+from carCount import RectPointsHandler, VideoHandler, start_car_counting, preload_model
+from video_index import VideoIndex, FrameScrubber
 
 default_selected_vehicles = [1, 2, 3, 4]  # Default selections
 selected_vehicles = default_selected_vehicles.copy()
@@ -65,6 +71,99 @@ class VehicleSelectionWindow(QDialog):
 
         
         
+class CountingWorker(QThread):
+    """
+    Runs start_car_counting off the GUI thread.
+
+    Preview frames are downscaled and sent at most preview_fps times per second, independent of the
+    processing rate, so showing them never slows down counting.
+    """
+    preview_ready = Signal(QImage)
+    counts_ready = Signal(str)
+    progress_changed = Signal(int)
+    counting_finished = Signal(dict)
+    counting_failed = Signal(str)
+
+    def __init__(self, video_path, video_writer_path, rect_points, speed_estimation, vehicles,
+                 preview_fps=10, preview_size=(640, 360), regions=None, parent=None):
+        super().__init__(parent)
+        self.video_path = video_path
+        self.video_writer_path = video_writer_path
+        self.rect_points = list(rect_points)
+        self.regions = regions
+        self.speed_estimation = speed_estimation
+        self.vehicles = list(vehicles)
+        self.preview_interval = 1.0 / preview_fps
+        self.preview_size = preview_size
+        self.last_preview = 0.0
+        self.stop_event = threading.Event()
+
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        self.duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps
+        cap.release()
+
+    def run(self):
+        try:
+            summary = start_car_counting(self.video_path,
+                                         self.video_writer_path,
+                                         self.rect_points,
+                                         self.speed_estimation,
+                                         self.vehicles,
+                                         view_img=False,
+                                         frame_callback=self.on_frame,
+                                         stop_event=self.stop_event,
+                                         regions=self.regions)
+        except Exception as error:
+            self.counting_failed.emit(str(error))
+            return
+        summary["cancelled"] = self.stop_event.is_set()
+        self.counting_finished.emit(summary)
+
+    def cancel(self):
+        self.stop_event.set()
+
+    def on_frame(self, frame, counter, timestamp):
+        now = time.monotonic()
+        if now - self.last_preview < self.preview_interval:
+            return
+        self.last_preview = now
+
+        if frame is not None:
+            small = cv2.resize(frame, self.preview_size, interpolation=cv2.INTER_LINEAR)
+            rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+            width, height = self.preview_size
+            # copy() so the image owns its pixels once the numpy buffer goes away
+            self.preview_ready.emit(QImage(rgb.data, width, height, width * 3, QImage.Format_RGB888).copy())
+
+        counts = ", ".join(f"{name}: {count}" for name, count in counter.class_counts.items())
+        self.counts_ready.emit(f"In: {counter.in_counts}  Out: {counter.out_counts}  {counts}")
+        if self.duration > 0:
+            self.progress_changed.emit(min(100, int(100 * timestamp / self.duration)))
+
+
+class IndexWorker(QThread):
+    """Builds (or loads the cached) keyframe index of a video off the GUI thread, a first scan can take minutes."""
+    index_ready = Signal(object)
+
+    def __init__(self, video_path, parent=None):
+        super().__init__(parent)
+        self.video_path = video_path
+        self.stop_event = threading.Event()
+
+    def run(self):
+        try:
+            index = VideoIndex.load(self.video_path, stop_event=self.stop_event)
+        except Exception as error:
+            print(f"Keyframe index of {self.video_path} not built: {error}")
+            return
+        if index is not None:
+            self.index_ready.emit(index)
+
+    def cancel(self):
+        self.stop_event.set()
+
+
 class CarCountingApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -76,11 +175,14 @@ class CarCountingApp(QMainWindow):
         self.rect_points = RectPointsHandler()
         self.video_handler = VideoHandler()
         self.rect_points_to_counting = []
+        self.regions = []  # completed regions, each a flat point list like rect_points_to_counting
         self.coordinate_scale = []
-        self.cap = None
+        self.scrubber = None
+        self.index_worker = None
         self.video_label = QLabel()
         self.video_scale_factor = 1.0
         self.speed_estimation = False
+        self.worker = None
         self.update_frame()
         self.init_ui()
         self.setMouseTracking(True)  # Enable mouse tracking for the widget
@@ -157,7 +259,14 @@ class CarCountingApp(QMainWindow):
         self.reset_button = QPushButton("Reset")
         self.reset_button.setStyleSheet("QPushButton { font-size: 14px; padding: 5px 10px; }")
         self.reset_button.clicked.connect(self.reset_drawing)
-        layout.addWidget(self.reset_button, 6, 1)
+
+        self.add_region_button = QPushButton("Add region")
+        self.add_region_button.setStyleSheet("QPushButton { font-size: 14px; padding: 5px 10px; }")
+        self.add_region_button.clicked.connect(self.add_region)
+        region_buttons = QHBoxLayout()
+        region_buttons.addWidget(self.add_region_button)
+        region_buttons.addWidget(self.reset_button)
+        layout.addLayout(region_buttons, 6, 1)
         
         button_style = "{ font-size: 14px; padding: 5px 10px; border-radius: 10px; border: 1px solid black}"
         button_style_hover = "{ background-color: #CAF4FF; border: 1px solid #6AD4DD}"
@@ -166,27 +275,50 @@ class CarCountingApp(QMainWindow):
         button_style_start = "{ font-size: 14px; padding: 5px 10px; background-color: #41B06E; border-radius: 10px; border: 1px solid black}"
         button_style_start_hover = "{ background-color: #8DECB4; }"
        
+        # Scrub slider over the keyframes of the video, for picking the frame to draw the region on
+        self.scrub_slider = QSlider(Qt.Horizontal)
+        self.scrub_slider.setEnabled(False)
+        # Seek only when the slider is released, while dragging only the time label follows
+        self.scrub_slider.setTracking(False)
+        self.scrub_slider.valueChanged.connect(self.scrub_to)
+        self.scrub_slider.sliderMoved.connect(self.show_scrub_time)
+        layout.addWidget(self.scrub_slider, 7, 0)
+
+        self.scrub_time = QLabel("00:00:00")
+        self.scrub_time.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.scrub_time, 7, 1)
+
         self.label = QLabel("Please select video:")
         self.label.setAlignment(Qt.AlignCenter)
-        layout.addWidget(self.label, 7, 0, 1, 2)
+        layout.addWidget(self.label, 8, 0, 1, 2)
         
         self.select_video_button = QPushButton("Choose Video")
         self.select_video_button.setStyleSheet(f"QPushButton {button_style} QPushButton:hover {button_style_hover}")
         self.select_video_button.clicked.connect(self.select_video)
-        layout.addWidget(self.select_video_button, 8, 0, 1, 2)
+        layout.addWidget(self.select_video_button, 9, 0, 1, 2)
 
         self.select_save_video_button = QPushButton("Save Video As...")
         self.select_save_video_button.setStyleSheet(f"QPushButton {button_style} QPushButton:hover {button_style_hover}")
         self.select_save_video_button.clicked.connect(self.select_save_video)
-        layout.addWidget(self.select_save_video_button, 9, 0, 1, 2)
+        layout.addWidget(self.select_save_video_button, 10, 0, 1, 2)
         
         self.start_counting_button = QPushButton("Start Car Counting")
         self.start_counting_button.setStyleSheet(f"QPushButton {button_style_start} QPushButton:hover {button_style_start_hover} QPushButton:disabled {button_style_disable}")
         self.start_counting_button.clicked.connect(self.start_car_counting)
-        layout.addWidget(self.start_counting_button, 10, 0, 1, 2)
+        layout.addWidget(self.start_counting_button, 11, 0, 1, 2)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        layout.addWidget(self.progress_bar, 12, 0)
+
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setStyleSheet(f"QPushButton {button_style} QPushButton:hover {button_style_hover}")
+        self.cancel_button.clicked.connect(self.cancel_car_counting)
+        layout.addWidget(self.cancel_button, 12, 1)
 
         self.start_counting_button.setEnabled(False)
         self.reset_button.setEnabled(False)
+        self.cancel_button.setEnabled(False)
 
     def btnstate(self, b):
         if b.text() == "rectangle" and b.isChecked():
@@ -211,7 +343,15 @@ class CarCountingApp(QMainWindow):
         filename, _ = QFileDialog.getOpenFileName(self, "Select Video File", "", "Video Files (*.mp4 *.avi)")
         if filename:
             self.video_handler.set_video_path(filename)
-            self.cap = cv2.VideoCapture(filename)
+            # Seek points every second until the keyframe index is built in the background
+            index = VideoIndex.load_cached(filename)
+            self.set_scrub_index(index or VideoIndex.fallback(filename), 0)
+            self.stop_index_worker()
+            if index is None:
+                self.index_worker = IndexWorker(filename, self)
+                self.index_worker.index_ready.connect(self.index_built)
+                self.index_worker.start()
+            self.scrub_slider.setEnabled(True)
             self.update_frame()
             self.label.setText(f"Video path: {self.video_handler.video_path}")
             self.start_counting_button.setEnabled(True)
@@ -235,8 +375,42 @@ class CarCountingApp(QMainWindow):
         """Exits the program gracefully."""
         self.close()
 
+    def set_scrub_index(self, index, position):
+        if self.scrubber is not None:
+            self.scrubber.close()
+        self.scrubber = FrameScrubber(index)
+        self.scrub_slider.blockSignals(True)
+        self.scrub_slider.setRange(0, max(0, len(index) - 1))
+        self.scrub_slider.setValue(position)
+        self.scrub_slider.blockSignals(False)
+
+    def stop_index_worker(self):
+        """Stops a running keyframe scan, a QThread destroyed while running aborts the application."""
+        if self.index_worker is not None and self.index_worker.isRunning():
+            self.index_worker.cancel()
+            self.index_worker.wait()
+        self.index_worker = None
+
+    def index_built(self, index):
+        """Swaps the keyframe index in, keeping the slider at the same point of the video."""
+        if self.scrubber is None or index.video_path != self.scrubber.index.video_path:
+            return  # another video was picked or the drawing was reset meanwhile
+        frame_no, _ = self.scrubber.index.keyframes[self.scrub_slider.value()]
+        self.set_scrub_index(index, index.nearest_keyframe(frame_no))
+
+    def show_scrub_time(self, position):
+        seconds = int(self.scrubber.index.keyframes[position][1] / 1000)
+        self.scrub_time.setText(f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}")
+
+    def scrub_to(self, position):
+        """Shows the keyframe at the slider position, the region has to be drawn again on the new frame."""
+        self.rect_points.rect_points = []
+        self.b1.setEnabled(True)
+        self.b2.setEnabled(True)
+        self.update_frame()
+
     def update_frame(self):
-        if not self.cap:
+        if not self.scrubber:
             self.video_label.setText("Please select video")
             self.video_label.setAlignment(Qt.AlignCenter)
             font = QFont()
@@ -244,15 +418,14 @@ class CarCountingApp(QMainWindow):
             self.video_label.setFont(font)
             return
 
-        ret, frame = self.cap.read()
-        if not ret:
+        position = self.scrub_slider.value()
+        frame_resized = self.scrubber.frame_at(position)
+        if frame_resized is None:
             print("Video stopped.")
-            self.cap.release()
             return
+        self.show_scrub_time(position)
 
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        target_width, target_height = 1280, 720
-        frame_resized = cv2.resize(frame_rgb, (target_width, target_height))
+        target_width, target_height = self.scrubber.size
         #make capture image
         q_img = QImage(frame_resized.data, target_width, target_height, target_width * 3, QImage.Format_RGB888)
         pixmap = QPixmap.fromImage(q_img)
@@ -265,6 +438,7 @@ class CarCountingApp(QMainWindow):
             self.btnstate(self.b2)
 
         self.rect_points_to_counting = []
+        self.regions = []
   
     def handle_mouse_move(self, event):
         position = event.position()
@@ -343,11 +517,28 @@ class CarCountingApp(QMainWindow):
         painter.end()
         self.video_label.setPixmap(pixmap)
 
+    def add_region(self):
+        """Keeps the region drawn so far and lets the next one be drawn on the same frame."""
+        if len(self.rect_points_to_counting) < 4:
+            self.show_message_box("Incomplete region", "Draw a line or rectangle before adding another region.")
+            return
+        self.regions.append(self.rect_points_to_counting)
+        self.rect_points_to_counting = []
+        self.rect_points.rect_points = []
+        self.b1.setEnabled(True)
+        self.b2.setEnabled(True)
+        self.btnstate(self.b1 if self.b1.isChecked() else self.b2)
+        self.label.setText(f"{len(self.regions)} region(s) added")
+
     def reset_drawing(self):
-        self.cap = None
+        if self.scrubber is not None:
+            self.scrubber.close()
+        self.scrubber = None
+        self.scrub_slider.setEnabled(False)
         self.video_handler.set_video_path(None)
         self.rect_points.rect_points = []
         self.rect_points_to_counting = []
+        self.regions = []
 
         pixmap = self.video_label.pixmap()
         painter = QPainter(pixmap)
@@ -363,8 +554,11 @@ class CarCountingApp(QMainWindow):
         self.b2.setEnabled(True)
 
     def start_car_counting(self):
+        if self.worker is not None and self.worker.isRunning():
+            return
         if self.video_handler.video_path:
-            if len(self.rect_points_to_counting) < 4:
+            regions = self.regions + ([self.rect_points_to_counting] if len(self.rect_points_to_counting) >= 4 else [])
+            if not regions:
                 self.show_message_box("Incomplete Rectangle", "Please select at least four points to define a rectangle.")
                 return
             if not self.video_handler.video_writer_path:
@@ -373,14 +567,65 @@ class CarCountingApp(QMainWindow):
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 filename = f"output_{timestamp}.avi"
                 self.video_handler.video_writer_path = os.path.join(default_dir, filename)
-            start_car_counting(self.video_handler.video_path,
-                               self.video_handler.video_writer_path,
-                               self.rect_points_to_counting,
-                               self.speed_estimation,
-                               selected_vehicles)
+            self.worker = CountingWorker(self.video_handler.video_path,
+                                         self.video_handler.video_writer_path,
+                                         regions[0],
+                                         self.speed_estimation,
+                                         selected_vehicles,
+                                         regions={f"region{i + 1}": points for i, points in enumerate(regions)}
+                                         if len(regions) > 1 else None,
+                                         parent=self)
+            self.worker.preview_ready.connect(self.show_preview)
+            self.worker.counts_ready.connect(self.label.setText)
+            self.worker.progress_changed.connect(self.progress_bar.setValue)
+            self.worker.counting_finished.connect(self.counting_finished)
+            self.worker.counting_failed.connect(self.counting_failed)
+            self.set_counting_state(True)
+            self.progress_bar.setValue(0)
+            self.worker.start()
         else:
             self.show_message_box("Video not select", "Please select a video first.")
 
+    def cancel_car_counting(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.cancel_button.setEnabled(False)
+
+    def set_counting_state(self, running):
+        self.start_counting_button.setEnabled(not running)
+        self.select_video_button.setEnabled(not running)
+        self.select_save_video_button.setEnabled(not running)
+        self.reset_button.setEnabled(not running)
+        self.add_region_button.setEnabled(not running)
+        self.scrub_slider.setEnabled(not running and self.scrubber is not None)
+        self.cancel_button.setEnabled(running)
+
+    def show_preview(self, image):
+        pixmap = QPixmap.fromImage(image).scaled(self.video_label.size(), Qt.KeepAspectRatio)
+        self.video_label.setPixmap(pixmap)
+
+    def counting_finished(self, summary):
+        self.set_counting_state(False)
+        if not summary["cancelled"]:
+            self.progress_bar.setValue(100)
+        status = "Cancelled" if summary["cancelled"] else "Finished"
+        regions = "".join(f"\n{name}: In: {counts['in']}  Out: {counts['out']}"
+                          for name, counts in summary.get("regions", {}).items())
+        self.show_message_box(f"Counting {status.lower()}",
+                              f"{status}: {summary['frames']} frames at {summary['fps']:.1f} fps\n"
+                              f"In: {summary['in_counts']}  Out: {summary['out_counts']}{regions}")
+
+    def counting_failed(self, message):
+        self.set_counting_state(False)
+        self.show_message_box("Counting failed", message)
+
+    def closeEvent(self, event):
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.cancel()
+            self.worker.wait()
+        self.stop_index_worker()
+        super().closeEvent(event)
+
     def show_message_box(self, title, message):
         msg_box = QMessageBox()
         msg_box.setWindowTitle(title)
@@ -403,4 +648,17 @@ if __name__ == "__main__":
   car_counting_app = CarCountingApp()
   car_counting_app.show()
   splash.finish(car_counting_app)
+  app.processEvents()
+  startup_timing = os.environ.get("CARCOUNT_STARTUP_TIMING")
+  if startup_timing:
+    print(f"Window ready in {time.perf_counter() - startup_time:.2f}s")
+
+  # Load the model while the user picks a video and draws the region
+  model_thread = preload_model()
+  if startup_timing:
+    def report_model_ready():
+      model_thread.join()
+      print(f"Model ready in {time.perf_counter() - startup_time:.2f}s")
+
+    threading.Thread(target=report_model_ready, daemon=True).start()
   sys.exit(app.exec())
@@ -0,0 +1,180 @@
+"""
+Per-stage latency and frame counters for the counting loop, published to a pluggable sink.
+
+start_car_counting and ObjectCounter only touch a Metrics object when one is passed in, so with metrics
+disabled the frame loop does nothing more than an `is not None` check per stage.
+
+Latencies are kept in a rolling window per stage and reduced to percentiles only when a snapshot is
+published (every `interval` seconds), never on the frame path.
+
+Example:
+    metrics = Metrics(JsonFileSink("./output/metrics/cam1.json"))   # or PrometheusSink(port=9108)
+    start_car_counting(..., metrics=metrics)
+"""
+
+import json, os, threading, time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Metrics:
+    """
+    Rolling per-stage latencies, counters and gauges.
+
+    Args:
+        sink (JsonFileSink | PrometheusSink): Receives a snapshot every `interval` seconds, None keeps them in memory.
+        interval (float): Seconds between snapshots published to the sink.
+        window (int): Number of most recent latencies per stage the percentiles are computed over.
+    """
+
+    def __init__(self, sink=None, interval=5.0, window=1000):
+        self.sink = sink
+        self.interval = interval
+        self.window = window
+        self.latencies = {}
+        self.totals = {}
+        self.counters = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.last_publish = self.started
+
+    def record(self, stage, seconds):
+        """Adds one latency sample (seconds) of a stage."""
+        with self.lock:
+            if stage not in self.latencies:
+                self.latencies[stage] = deque(maxlen=self.window)
+                self.totals[stage] = [0, 0.0]
+            self.latencies[stage].append(seconds)
+            total = self.totals[stage]
+            total[0] += 1
+            total[1] += seconds
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def snapshot(self):
+        """Current percentiles (ms), counters and gauges as a plain dict."""
+        with self.lock:
+            latencies = {stage: np.array(samples) for stage, samples in self.latencies.items()}
+            totals = {stage: tuple(total) for stage, total in self.totals.items()}
+            counters = dict(self.counters)
+        stages = {}
+        for stage, samples in latencies.items():
+            count, seconds = totals[stage]
+            stages[stage] = {"count": count, "total_seconds": seconds}
+            if len(samples):
+                for q, value in zip(QUANTILES, np.quantile(samples, QUANTILES) * 1000):
+                    stages[stage][f"p{int(q * 100)}_ms"] = float(value)
+                stages[stage]["mean_ms"] = float(samples.mean() * 1000)
+        elapsed = time.monotonic() - self.started
+        processed = counters.get("frames_processed", 0)
+        return {
+            "time": time.time(),
+            "uptime_seconds": elapsed,
+            "fps": processed / elapsed if elapsed > 0 else 0.0,
+            "stages": stages,
+            "counters": counters,
+            "gauges": dict(self.gauges),
+        }
+
+    def poll(self):
+        """Publishes a snapshot when the interval has passed, cheap enough to call every frame."""
+        if self.sink is not None and time.monotonic() - self.last_publish >= self.interval:
+            self.publish()
+
+    def publish(self):
+        self.last_publish = time.monotonic()
+        if self.sink is not None:
+            self.sink.publish(self.snapshot())
+
+    def close(self):
+        self.publish()
+        if self.sink is not None:
+            self.sink.close()
+
+
+class JsonFileSink:
+    """Overwrites `path` with the latest snapshot, atomically so readers never see a partial file."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def publish(self, snapshot):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(snapshot, file, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        pass
+
+
+def prometheus_text(snapshot, prefix="carcount"):
+    """Renders a snapshot in the Prometheus text exposition format."""
+    lines = [f"# TYPE {prefix}_stage_latency_seconds summary"]
+    for stage, values in snapshot["stages"].items():
+        for q in QUANTILES:
+            key = f"p{int(q * 100)}_ms"
+            if key in values:
+                lines.append(f'{prefix}_stage_latency_seconds{{stage="{stage}",quantile="{q}"}} {values[key] / 1000:.6f}')
+        lines.append(f'{prefix}_stage_latency_seconds_count{{stage="{stage}"}} {values["count"]}')
+        lines.append(f'{prefix}_stage_latency_seconds_sum{{stage="{stage}"}} {values["total_seconds"]:.6f}')
+    for name, value in snapshot["counters"].items():
+        lines.append(f"# TYPE {prefix}_{name}_total counter")
+        lines.append(f"{prefix}_{name}_total {value}")
+    for name, value in snapshot["gauges"].items():
+        lines.append(f"# TYPE {prefix}_{name} gauge")
+        lines.append(f"{prefix}_{name} {value}")
+    lines.append(f"# TYPE {prefix}_fps gauge")
+    lines.append(f"{prefix}_fps {snapshot['fps']:.3f}")
+    return "\n".join(lines) + "\n"
+
+
+class PrometheusSink:
+    """
+    Serves the latest snapshot on http://host:port/metrics from a daemon thread.
+
+    Args:
+        port (int): Port to listen on.
+        host (str): Interface to bind, localhost only by default.
+    """
+
+    def __init__(self, port=9108, host="127.0.0.1"):
+        self.text = prometheus_text({"stages": {}, "counters": {}, "gauges": {}, "fps": 0.0})
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = sink.text.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def publish(self, snapshot):
+        self.text = prometheus_text(snapshot)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
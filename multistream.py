@@ -0,0 +1,165 @@
+"""
+Counts vehicles on several streams at once with a single shared model.
+
+The current frame of every stream is gathered into one batched forward pass of carCount.get_model(), then each
+result is handed to that stream's own tracker and ObjectCounter. One copy of the weights serves all cameras
+and the per-call overhead of the predictor is paid once per batch instead of once per frame.
+
+Example:
+    python multistream.py --job-file streams.json --classes 1 2 3 4
+
+streams.json is a JSON list of {"video": ..., "points": [...], "output": ...} entries, points use the
+1280-wide frame coordinates of the GUI.
+"""
+
+import argparse, json, os, sys, time
+
+import cv2
+
+import carCount, videowriter
+from tracking import apply_tracker, create_tracker, track_low_thresh
+
+
+class Stream:
+    """Per-stream state: capture, tracker, counter and writer."""
+
+    def __init__(self, video_path, video_writer_path, rect_points, speed_estimation, tracker_cfg="botsort.yaml"):
+        self.video_path = video_path
+        self.cap = cv2.VideoCapture(video_path)
+        assert self.cap.isOpened(), f"Error reading video file {video_path}"
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        # max_time_lost is counted in frames, so the tracker has to know the stream's frame rate
+        self.tracker = create_tracker(tracker_cfg, frame_rate=int(round(self.fps or 30)))
+        self.counter = carCount.create_counter(carCount.parse_region_points(rect_points), speed_estimation,
+                                               view_img=False)
+        self.video_writer = None
+        if video_writer_path:
+            # Sized from the first frame, resized frames are only 720 high for 16:9 cameras
+            self.video_writer = videowriter.AsyncVideoWriter(video_writer_path, self.fps or 30)
+        self.frame_count = 0
+        self.done = False
+
+    def read(self, window_width):
+        """Reads the next resized frame and its video timestamp, marks the stream done at the end of the video."""
+        success, frame = self.cap.read()
+        if not success:
+            self.done = True
+            return None
+        timestamp = carCount.get_frame_timestamp(self.cap, self.frame_count, self.fps)
+        return carCount.resize_frame(frame, window_width), timestamp
+
+    def process(self, result, frame, timestamp):
+        results = [apply_tracker(self.tracker, result, frame, conf=0.5)]
+        time_info = carCount.format_time_info(timestamp * 1000)
+        annotated_frame = carCount.annotate_frame(results, time_info)
+        annotated_frame = self.counter.start_counting(annotated_frame, results, time_info, timestamp)
+        if self.video_writer is not None:
+            self.video_writer.write(annotated_frame, timestamp)
+        self.frame_count += 1
+
+    def close(self):
+        self.cap.release()
+        if self.video_writer is not None:
+            self.video_writer.release()
+
+    def summary(self, elapsed):
+        return {
+            "video_path": self.video_path,
+            "frames": self.frame_count,
+            "seconds": elapsed,
+            "fps": self.frame_count / elapsed if elapsed > 0 else 0.0,
+            "in_counts": self.counter.in_counts,
+            "out_counts": self.counter.out_counts,
+            "class_counts": dict(self.counter.class_counts),
+        }
+
+
+class MultiStreamRunner:
+    """
+    Round-robins over streams, batching one frame from each active stream per forward pass.
+
+    Args:
+        streams (list): Stream objects to process.
+        selected_vehicles (list): Class ids passed to the detector.
+        max_batch (int): Upper bound on frames per forward pass, None batches all active streams.
+        window_width (int): Width every frame is resized to before inference.
+    """
+
+    def __init__(self, streams, selected_vehicles, max_batch=None, window_width=1280):
+        self.streams = streams
+        self.selected_vehicles = selected_vehicles
+        self.max_batch = max_batch
+        self.window_width = window_width
+
+    def _gather(self):
+        batch = []
+        for stream in self.streams:
+            if stream.done:
+                continue
+            item = stream.read(self.window_width)
+            if item is not None:
+                batch.append((stream, *item))
+        return batch
+
+    def run(self, csv_dir="./output/csv/"):
+        start_time = time.perf_counter()
+        batches = 0
+        while True:
+            batch = self._gather()
+            if not batch:
+                break
+            step = self.max_batch or len(batch)
+            for i in range(0, len(batch), step):
+                chunk = batch[i:i + step]
+                frames = [frame for _, frame, _ in chunk]
+                # Weak boxes are kept for the trackers' low-score round, Stream.process drops them after association
+                conf = min(track_low_thresh(stream.tracker) for stream, _, _ in chunk)
+                results = carCount.get_model().predict(frames, conf=conf, classes=self.selected_vehicles, verbose=False)
+                for (stream, frame, timestamp), result in zip(chunk, results):
+                    stream.process(result, frame, timestamp)
+                batches += 1
+        elapsed = time.perf_counter() - start_time
+
+        summaries = []
+        for stream in self.streams:
+            stream.close()
+            name = os.path.splitext(os.path.basename(stream.video_path))[0]
+            carCount.csvHandler().export_to_csv(stream.counter.object_info, name, csv_dir)
+            summaries.append(stream.summary(elapsed))
+        print(f"{len(self.streams)} stream(s), {batches} batched forward passes in {elapsed:.1f}s")
+        return summaries
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Count vehicles on many streams with one shared model.")
+    parser.add_argument("--job-file", required=True, help="JSON list of {video, points, output} entries")
+    parser.add_argument("--classes", nargs="+", type=int, default=[1, 2, 3, 4], help="Class ids to count")
+    parser.add_argument("--speed", action="store_true", help="Enable speed estimation")
+    parser.add_argument("--max-batch", type=int, default=None, help="Maximum frames per forward pass")
+    parser.add_argument("--tracker", default="botsort.yaml",
+                        help="Ultralytics tracker config (botsort.yaml, bytetrack.yaml, custom yaml) or iou")
+    parser.add_argument("--output-dir", default="./output/", help="Directory for videos and csv files")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with open(args.job_file) as file:
+        spec = json.load(file)
+
+    os.makedirs(os.path.join(args.output_dir, "video"), exist_ok=True)
+    streams = []
+    for entry in spec:
+        name = os.path.splitext(os.path.basename(entry["video"]))[0]
+        output = entry.get("output", os.path.join(args.output_dir, "video", f"{name}.avi"))
+        streams.append(Stream(entry["video"], output, entry["points"], args.speed, args.tracker))
+
+    runner = MultiStreamRunner(streams, args.classes, max_batch=args.max_batch)
+    for summary in runner.run(csv_dir=os.path.join(args.output_dir, "csv")):
+        print(f"{summary['video_path']}: {summary['frames']} frames, "
+              f"in={summary['in_counts']} out={summary['out_counts']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
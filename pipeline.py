@@ -0,0 +1,105 @@
+"""
+Threaded stage pipeline used by start_car_counting(pipelined=True).
+
+Every stage runs on its own thread and the stages are joined by bounded queues, so a slow stage blocks
+the ones in front of it (backpressure) instead of letting frames pile up in memory. Each stage is a single
+thread reading a FIFO queue, so frame order is kept from source to sink. OpenCV and torch release the GIL
+in decode, inference and encode, so throughput approaches that of the slowest stage.
+"""
+
+import queue, threading
+
+_END = object()
+
+
+class _Failure:
+    """Carries an exception raised in a worker thread to the consumer thread."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+class StagePipeline:
+    """
+    Runs source -> stage -> ... -> sink with one thread per stage.
+
+    Args:
+        source (iterable): Produces the items, iterated on its own thread.
+        stages (list): Callables applied in order, each on its own thread.
+        sink (callable): Called on the calling thread with every final item, returning False stops the pipeline.
+        queue_size (int): Capacity of every queue between two stages.
+    """
+
+    def __init__(self, source, stages, sink, queue_size=8):
+        self.source = source
+        self.stages = list(stages)
+        self.sink = sink
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(len(self.stages) + 1)]
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def _put(self, q, item):
+        """Blocking put that gives up once the pipeline is stopping."""
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self.stop_event.is_set():
+                    return _END
+
+    def _run_source(self, out_q):
+        try:
+            for item in self.source:
+                if not self._put(out_q, item):
+                    return
+        except Exception as error:
+            self._put(out_q, _Failure(error))
+            return
+        self._put(out_q, _END)
+
+    def _run_stage(self, func, in_q, out_q):
+        while True:
+            item = self._get(in_q)
+            if item is _END or isinstance(item, _Failure):
+                self._put(out_q, item)
+                return
+            try:
+                result = func(item)
+            except Exception as error:
+                self._put(out_q, _Failure(error))
+                return
+            if not self._put(out_q, result):
+                return
+
+    def run(self):
+        """Starts all worker threads and drives the sink until the source is exhausted or the sink stops."""
+        self.threads.append(threading.Thread(target=self._run_source, args=(self.queues[0],), daemon=True))
+        for i, func in enumerate(self.stages):
+            self.threads.append(threading.Thread(target=self._run_stage,
+                                                 args=(func, self.queues[i], self.queues[i + 1]),
+                                                 daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+        try:
+            while True:
+                item = self._get(self.queues[-1])
+                if item is _END:
+                    break
+                if isinstance(item, _Failure):
+                    raise item.error
+                if self.sink(item) is False:
+                    break
+        finally:
+            self.stop_event.set()
+            for thread in self.threads:
+                thread.join()
@@ -0,0 +1,72 @@
+"""
+Decoded frame straight to model input in one resize.
+
+By default a frame is resized to the 1280-wide working size and ultralytics then letterboxes that copy again
+to the model input size, allocating new arrays at every step. Preprocessor resizes the decoded frame once into
+a preallocated letterboxed tensor, which the model takes as is. Boxes come back in model input coordinates
+and are mapped to the working size by one explicit scale + offset, so counting and drawing keep using the
+same 1280-wide coordinates as the GUI points.
+"""
+
+import math
+
+import cv2
+import numpy as np
+import torch
+
+
+class Preprocessor:
+    """
+    Letterboxes frames of one fixed source size into a reused (1, 3, H, W) float tensor.
+
+    Args:
+        source_shape (tuple): (height, width) of the decoded frames.
+        window_width (int): Width of the working frames counting and drawing use.
+        imgsz (int): Model input size of the longest side.
+        square (bool): Pad to imgsz x imgsz (fixed-shape ONNX exports), otherwise only to a multiple of stride.
+        stride (int): Model stride the padded input size must be a multiple of.
+    """
+
+    def __init__(self, source_shape, window_width=1280, imgsz=640, square=False, stride=32):
+        height, width = source_shape[:2]
+        self.gain = min(imgsz / height, imgsz / width)
+        new_w, new_h = int(round(width * self.gain)), int(round(height * self.gain))
+        input_w = imgsz if square else math.ceil(new_w / stride) * stride
+        input_h = imgsz if square else math.ceil(new_h / stride) * stride
+        self.left, self.top = (input_w - new_w) // 2, (input_h - new_h) // 2
+        self.resized_size = (new_w, new_h)
+        self.interpolation = cv2.INTER_AREA if self.gain < 1 else cv2.INTER_LINEAR
+
+        self.resized = np.empty((new_h, new_w, 3), dtype=np.uint8)
+        self.rgb = np.empty((new_h, new_w, 3), dtype=np.uint8)
+        self.tensor = torch.full((1, 3, input_h, input_w), 114 / 255)
+        self.image = self.tensor[0, :, self.top:self.top + new_h, self.left:self.left + new_w]
+
+        # Model input -> working frame: window = (model - offset) * scale
+        self.window_size = (window_width, int(height * window_width / width))
+        self.scale = window_width / (width * self.gain)
+
+    def __call__(self, frame):
+        """Returns the model input for a BGR frame, the same tensor object is refilled on every call."""
+        cv2.resize(frame, self.resized_size, dst=self.resized, interpolation=self.interpolation)
+        cv2.cvtColor(self.resized, cv2.COLOR_BGR2RGB, dst=self.rgb)
+        self.image.copy_(torch.from_numpy(self.rgb).permute(2, 0, 1)).mul_(1 / 255)
+        return self.tensor
+
+    def to_window(self, results, frame=None):
+        """
+        Maps results computed on the model input to working frame coordinates.
+
+        Args:
+            results (list): Output of model.track/predict on the tensor.
+            frame (ndarray): Working-size frame the results are drawn on, None when nothing is drawn.
+        """
+        result = results[0]
+        if frame is not None:
+            result.orig_img = frame
+        result.orig_shape = self.window_size[::-1]
+        data = result.boxes.data.clone()
+        data[:, [0, 2]] = (data[:, [0, 2]] - self.left) * self.scale
+        data[:, [1, 3]] = (data[:, [1, 3]] - self.top) * self.scale
+        result.update(boxes=data)
+        return results
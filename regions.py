@@ -0,0 +1,128 @@
+"""
+Several named counting regions and lines evaluated in one pass per frame.
+
+Polygons and lines are each put in a shapely STRtree once. Every frame the centroids are queried against the
+polygon tree and the centroid movement segments against the line tree, so only vehicle/region pairs that
+actually overlap are looked at and the cost grows with the number of vehicles, not vehicles x regions.
+
+Polygons count "in" when a centroid enters and "out" when it leaves, like the single region counter.
+Lines count a crossing when the movement segment intersects the line, "in" when moving to the right side of
+the line as seen on screen going from its first to its second point, and "out" the other way.
+"""
+
+from collections import defaultdict
+
+import numpy as np
+import shapely
+from shapely.geometry import LineString, Polygon
+
+MAX_POLYGONS = 64  # inside state is one bit per polygon in an int64
+
+
+class RegionSet:
+    """
+    Named polygons and lines with per-region counts and per-track inside state.
+
+    Args:
+        regions (dict): name -> list of (x, y) points, 2 points make a line and 3 or more a polygon.
+    """
+
+    def __init__(self, regions):
+        self.names = list(regions)
+        self.polygon_names, polygons = [], []
+        self.line_names, lines = [], []
+        for name, points in regions.items():
+            points = [tuple(point) for point in points]
+            if len(points) == 2:
+                self.line_names.append(name)
+                lines.append(LineString(points))
+            elif len(points) >= 3:
+                self.polygon_names.append(name)
+                polygons.append(Polygon(points))
+            else:
+                raise ValueError(f"Region '{name}' needs 2 points for a line or >= 3 for a polygon")
+        if len(polygons) > MAX_POLYGONS:
+            raise ValueError(f"At most {MAX_POLYGONS} polygon regions are supported, got {len(polygons)}")
+
+        self.regions = {name: [tuple(point) for point in points] for name, points in regions.items()}
+        self.polygon_tree = shapely.STRtree(polygons) if polygons else None
+        self.line_tree = shapely.STRtree(lines) if lines else None
+        self.line_coords = np.array([line.coords for line in lines], dtype=float).reshape(-1, 2, 2)
+        self.inside = np.zeros(0, dtype=np.int64)  # bitmask of polygons each track slot is inside
+        self.counts = {name: {"in": 0, "out": 0} for name in self.names}
+        self.class_counts = {name: defaultdict(int) for name in self.names}
+
+    def _ensure_capacity(self, slots):
+        needed = int(slots.max()) + 1
+        if needed > len(self.inside):
+            extra = max(needed, 2 * len(self.inside)) - len(self.inside)
+            self.inside = np.concatenate([self.inside, np.zeros(extra, dtype=np.int64)])
+
+    def update(self, slots, known, centroids, prev_positions):
+        """
+        Tests all centroids of a frame against all regions and updates the per-region counts.
+
+        Args:
+            slots (ndarray): TrackStore slot of every track.
+            known (ndarray): Tracks seen before, new tracks only get their state initialised.
+            centroids (ndarray): (N, 2) current centroids.
+            prev_positions (ndarray): (N, 2) previous centroids, nan for new tracks.
+
+        Returns:
+            (list): (track index, region name, "in" | "out") for every crossing, ordered by track index.
+        """
+        events = []
+        self._ensure_capacity(slots)
+
+        if self.polygon_tree is not None:
+            track_idx, polygon_idx = self.polygon_tree.query(shapely.points(centroids), predicate="within")
+            current = np.zeros(len(slots), dtype=np.int64)
+            np.bitwise_or.at(current, track_idx, np.left_shift(1, polygon_idx.astype(np.int64)))
+            previous = self.inside[slots]
+            changed = np.where(known, previous ^ current, 0)
+            self.inside[slots] = current
+            for i in np.flatnonzero(changed):
+                for bit in range(len(self.polygon_names)):
+                    if changed[i] >> bit & 1:
+                        events.append((i, self.polygon_names[bit], "in" if current[i] >> bit & 1 else "out"))
+
+        moving = np.flatnonzero(~np.isnan(prev_positions[:, 0]))
+        if self.line_tree is not None and len(moving):
+            segments = shapely.linestrings(np.stack([prev_positions[moving], centroids[moving]], axis=1))
+            segment_idx, line_idx = self.line_tree.query(segments, predicate="intersects")
+            start, end = self.line_coords[line_idx, 0], self.line_coords[line_idx, 1]
+            direction = end - start
+            track_idx = moving[segment_idx]
+
+            def side(points):
+                offset = points - start
+                return direction[:, 0] * offset[:, 1] - direction[:, 1] * offset[:, 0]
+
+            prev_side, current_side = side(prev_positions[track_idx]), side(centroids[track_idx])
+            entered = (prev_side < 0) & (current_side >= 0)
+            exited = (prev_side >= 0) & (current_side < 0)
+            for i, line, is_in, is_out in zip(track_idx.tolist(), line_idx.tolist(), entered, exited):
+                if is_in or is_out:
+                    events.append((i, self.line_names[line], "in" if is_in else "out"))
+
+        events.sort(key=lambda event: event[0])
+        return events
+
+    def state_dict(self):
+        return {"counts": self.counts, "class_counts": {name: dict(c) for name, c in self.class_counts.items()},
+                "inside": self.inside}
+
+    def load_state_dict(self, state):
+        self.counts = state["counts"]
+        self.class_counts = {name: defaultdict(int, c) for name, c in state["class_counts"].items()}
+        self.inside = state["inside"]
+
+    def record(self, name, direction, class_name):
+        self.counts[name][direction] += 1
+        if direction == "in":
+            self.class_counts[name][class_name] += 1
+
+    def summary(self):
+        """Per-region counts as plain dicts."""
+        return {name: {"in": self.counts[name]["in"], "out": self.counts[name]["out"],
+                       "class_counts": dict(self.class_counts[name])} for name in self.names}
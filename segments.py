@@ -0,0 +1,276 @@
+"""
+Counts one long video on many cores by splitting it into time segments processed in parallel.
+
+The video is cut at N-1 boundaries. Every segment is run by start_car_counting in its own process with its
+own model, tracker and ObjectCounter, and additionally processes `overlap` seconds past each of its
+boundaries. In the shared frames around a boundary both neighbours see the same vehicles, their tracks are
+stitched by matching centroids frame by frame, and the crossing events are merged so every vehicle is
+counted exactly once:
+
+    - an event seen by both neighbours for the same stitched vehicle, region and direction is kept once,
+      from the earlier segment;
+    - an event seen by one side only is kept by the segment that owns its time (before the boundary
+      belongs to the earlier segment, at or after it to the later one).
+
+Segments run in analytics-only mode, no video is written.
+
+Example:
+    python segments.py day.mp4 --points 20 400 1260 400 --mode line --segments 16 --overlap 3
+"""
+
+import argparse, json, os, sys, time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from batch import DEFAULT_CLASSES, check_points
+
+
+class MemorySink:
+    """Collects crossing events in a list, stands in for an events.EventSink inside a segment worker."""
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+    def poll(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def plan_segments(frame_count, fps, num_segments, overlap):
+    """
+    Splits [0, frame_count) into equal segments.
+
+    Returns:
+        (list): (boundary start frame, boundary end frame, first frame read, last frame read + 1) per segment.
+    """
+    overlap_frames = int(round(overlap * fps))
+    bounds = np.linspace(0, frame_count, num_segments + 1).round().astype(int)
+    if num_segments > 1 and np.diff(bounds).min() <= 2 * overlap_frames:
+        raise ValueError(f"Segments of {np.diff(bounds).min()} frames are too short for {overlap}s overlap")
+    return [(int(start), int(end), max(0, int(start) - overlap_frames), min(frame_count, int(end) + overlap_frames))
+            for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def run_segment(job):
+    """Worker entry point, counts one segment and records the tracks seen in its overlap windows."""
+    import torch
+    import carCount
+
+    torch.set_num_threads(job["threads"])
+    sink = MemorySink()
+    windows = job["windows"]
+    overlap_tracks = {}
+
+    def record_tracks(frame, counter, timestamp):
+        if not any(lo <= timestamp < hi for lo, hi in windows):
+            return
+        store = counter.tracks
+        slots = np.flatnonzero((store.ids >= 0) & (store.last_seen == store.frame_idx))
+        overlap_tracks[round(timestamp, 3)] = (store.ids[slots].tolist(), store.last_trail_points(slots).tolist())
+
+    summary = carCount.start_car_counting(job["video"], None, job["points"], job["speed"], job["classes"],
+                                          view_img=False, analytics_only=True, regions=job["regions"],
+                                          detect_stride=job["detect_stride"], backend=job["backend"],
+                                          frame_range=job["frame_range"], event_sink=sink,
+                                          frame_callback=record_tracks)
+    return {"summary": summary, "events": sink.records, "tracks": overlap_tracks}
+
+
+def stitch_tracks(left_tracks, right_tracks, max_distance=30.0):
+    """
+    Maps track ids of the later segment to ids of the earlier one for the vehicles both saw.
+
+    Centroids of the frames both segments processed are matched greedily by distance, every pair that is
+    matched in more frames than any other pairing of its ids is taken as the same vehicle.
+    """
+    votes = Counter()
+    for timestamp in left_tracks.keys() & right_tracks.keys():
+        left_ids, left_points = left_tracks[timestamp]
+        right_ids, right_points = right_tracks[timestamp]
+        if not left_ids or not right_ids:
+            continue
+        distance = np.linalg.norm(np.array(left_points)[:, None] - np.array(right_points)[None], axis=2)
+        distance[np.isnan(distance)] = np.inf
+        while True:
+            i, j = np.unravel_index(np.argmin(distance), distance.shape)
+            if distance[i, j] > max_distance:
+                break
+            votes[(left_ids[i], right_ids[j])] += 1
+            distance[i, :] = np.inf
+            distance[:, j] = np.inf
+
+    mapping, used = {}, set()
+    for (left_id, right_id), _ in votes.most_common():
+        if right_id not in mapping and left_id not in used:
+            mapping[right_id] = left_id
+            used.add(left_id)
+    return mapping
+
+
+def match_events(left_events, right_events, mapping):
+    """Pairs events of the same stitched vehicle, region and direction, returns (left index, right index) pairs."""
+    pairs, taken = [], set()
+    for j, right in enumerate(right_events):
+        left_id = mapping.get(right["track_id"])
+        if left_id is None:
+            continue
+        for i, left in enumerate(left_events):
+            if (i not in taken and left["track_id"] == left_id and left["direction"] == right["direction"]
+                    and left.get("region") == right.get("region")):
+                pairs.append((i, j))
+                taken.add(i)
+                break
+    return pairs
+
+
+def merge_segments(results, boundaries):
+    """
+    Merges the events of all segments, dropping the duplicates around each boundary.
+
+    Args:
+        results (list): run_segment outputs in segment order.
+        boundaries (list): Boundary times in seconds between consecutive segments.
+
+    Returns:
+        (list): Kept events in time order, each tagged with its segment.
+    """
+    keep = [[True] * len(result["events"]) for result in results]
+    for k, boundary in enumerate(boundaries):
+        left, right = results[k], results[k + 1]
+        mapping = stitch_tracks(left["tracks"], right["tracks"])
+        pairs = match_events(left["events"], right["events"], mapping)
+        left_paired = {i for i, _ in pairs}
+        right_paired = {j for _, j in pairs}
+        for i, event in enumerate(left["events"]):
+            if event["timestamp"] >= boundary and i not in left_paired:
+                keep[k][i] = False  # only this side saw it and it belongs to the later segment
+        for j, event in enumerate(right["events"]):
+            if j in right_paired or event["timestamp"] < boundary:
+                keep[k + 1][j] = False  # seen by both (the earlier segment keeps it) or owned by the earlier one
+
+    merged = []
+    for k, result in enumerate(results):
+        for event, kept in zip(result["events"], keep[k]):
+            if kept:
+                merged.append(dict(event, segment=k))
+    merged.sort(key=lambda event: event["timestamp"])
+    return merged
+
+
+def count_events(merged):
+    totals = {"in_counts": 0, "out_counts": 0, "class_counts": defaultdict(int), "regions": {}}
+    for event in merged:
+        totals[f"{event['direction']}_counts"] += 1
+        if event["direction"] == "in":
+            totals["class_counts"][event["class_name"]] += 1
+        if event.get("region") is not None:
+            region = totals["regions"].setdefault(event["region"], {"in": 0, "out": 0})
+            region[event["direction"]] += 1
+    totals["class_counts"] = dict(totals["class_counts"])
+    return totals
+
+
+def count_video_in_segments(video_path, points, classes, num_segments, overlap=3.0, speed=False, regions=None,
+                            detect_stride=1, backend="pt", workers=None):
+    """
+    Counts a video split into num_segments parallel segments.
+
+    Returns:
+        (tuple): summary dict with merged counts, and the merged events.
+    """
+    cap = cv2.VideoCapture(video_path)
+    assert cap.isOpened(), f"Error reading video file {video_path}"
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    plan = plan_segments(frame_count, fps, num_segments, overlap)
+    boundaries = [start / fps for start, _, _, _ in plan[1:]]
+    workers = workers or min(num_segments, os.cpu_count() or 1)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    jobs = []
+    for k, (start, end, first, last) in enumerate(plan):
+        windows = [(first / fps, start / fps + overlap)] if k > 0 else []
+        if k < len(plan) - 1:
+            windows.append((end / fps - overlap, last / fps))
+        jobs.append({"video": video_path, "points": points, "classes": classes, "speed": speed, "regions": regions,
+                     "detect_stride": detect_stride, "backend": backend, "frame_range": (first, last),
+                     "windows": windows, "threads": threads})
+
+    import backends
+
+    backends.build_artifacts(backend, calibration_videos=[video_path])  # once, not raced by every segment
+    print(f"Counting {video_path} in {len(plan)} segment(s) with {workers} worker(s)")
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run_segment, jobs))
+    elapsed = time.perf_counter() - start_time
+
+    merged = merge_segments(results, boundaries)
+    summary = dict(count_events(merged), video_path=video_path, frames=frame_count, seconds=elapsed,
+                   fps=frame_count / elapsed if elapsed > 0 else 0.0, segments=len(plan),
+                   events_before_merge=sum(len(result["events"]) for result in results))
+    return summary, merged
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Count one long video as parallel time segments.")
+    parser.add_argument("video", help="Video file")
+    parser.add_argument("--points", nargs="+", type=int, default=[],
+                        help="Region points as x1 y1 x2 y2 ... in 1280-wide frame coordinates")
+    parser.add_argument("--mode", choices=["line", "polygon"], default=None,
+                        help="Counting region type the points are checked against, inferred from their count")
+    parser.add_argument("--regions", help='JSON file {"name": [x1, y1, x2, y2, ...]} of regions counted together')
+    parser.add_argument("--classes", nargs="+", type=int, default=DEFAULT_CLASSES, help="Class ids to count")
+    parser.add_argument("--speed", action="store_true", help="Enable speed estimation")
+    parser.add_argument("--segments", type=int, default=os.cpu_count() or 1, help="Number of segments")
+    parser.add_argument("--overlap", type=float, default=3.0,
+                        help="Seconds each segment also processes past its boundaries for track stitching")
+    parser.add_argument("--detect-stride", type=int, default=1,
+                        help="Run the detector on every Nth frame and interpolate boxes in between")
+    parser.add_argument("--backend", choices=["pt", "onnx", "onnx-int8"], default="pt", help="Inference backend")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes, defaults to one per segment")
+    parser.add_argument("--output-dir", default="./output/", help="Directory for the merged events csv")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    import events
+
+    args = parse_args(argv)
+    regions = None
+    if args.regions:
+        with open(args.regions) as file:
+            regions = {name: check_points(points)
+                       for name, points in json.load(file).items()}
+    elif args.points:
+        args.points = check_points(args.points, args.mode)
+    else:
+        raise ValueError("Give --points or --regions")
+
+    summary, merged = count_video_in_segments(args.video, args.points, args.classes, args.segments, args.overlap,
+                                              args.speed, regions, args.detect_stride, args.backend, args.workers)
+    name = os.path.splitext(os.path.basename(args.video))[0]
+    sink = events.create_event_sink("csv", os.path.join(args.output_dir, "csv"), f"{name}_segments")
+    for event in merged:
+        sink.write(event)
+    sink.close()
+
+    print(f"{summary['frames']} frames in {summary['seconds']:.1f}s ({summary['fps']:.1f} fps), "
+          f"{summary['segments']} segments, {summary['events_before_merge']} events merged to {len(merged)}")
+    print(f"In counts: {summary['in_counts']}, out counts: {summary['out_counts']}, {summary['class_counts']}")
+    for region, counts in summary["regions"].items():
+        print(f"    {region}: in={counts['in']} out={counts['out']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
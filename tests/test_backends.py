@@ -0,0 +1,21 @@
+import os
+from types import SimpleNamespace
+
+import backends
+
+
+def test_detect_head_nodes_are_the_last_module():
+    names = ["/model.0/conv/Conv", "/model.21/m.0/cv1/conv/Conv", "/model.22/cv2.0/cv2.0.0/conv/Conv",
+             "/model.22/dfl/conv/Conv", "/model.22/Concat_3", "output0"]
+    model = SimpleNamespace(graph=SimpleNamespace(node=[SimpleNamespace(name=name) for name in names]))
+    assert backends.detect_head_nodes(model) == names[2:5]
+
+
+def test_artifact_without_weights_is_current(tmp_path):
+    artifact, weights = tmp_path / "model.onnx", tmp_path / "model.pt"
+    assert not backends._is_fresh(str(artifact), str(weights))
+    artifact.touch()
+    assert backends._is_fresh(str(artifact), str(weights))
+    weights.touch()
+    os.utime(weights, (os.path.getmtime(artifact) + 10,) * 2)
+    assert not backends._is_fresh(str(artifact), str(weights))
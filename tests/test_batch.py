@@ -0,0 +1,23 @@
+import pytest
+
+import batch
+
+
+def jobs(tmp_path, *argv):
+    return batch.build_jobs(batch.parse_args([*argv, "--output-dir", str(tmp_path / "out")]))
+
+
+def test_region_type_follows_the_point_count(tmp_path):
+    (tmp_path / "cam.mp4").touch()
+    assert jobs(tmp_path, str(tmp_path), "--points", "20", "400", "1260", "400")[0]["points"] == [20, 400, 1260, 400]
+    assert len(jobs(tmp_path, str(tmp_path), "--points", "0", "0", "10", "0", "10", "10")[0]["points"]) == 6
+    with pytest.raises(ValueError):
+        jobs(tmp_path, str(tmp_path), "--points", "20", "400")
+
+
+def test_same_video_name_in_two_directories_is_rejected(tmp_path):
+    for directory in ("a", "b"):
+        (tmp_path / directory).mkdir()
+        (tmp_path / directory / "cam.mp4").touch()
+    with pytest.raises(ValueError, match="same csv output"):
+        jobs(tmp_path, str(tmp_path / "a"), str(tmp_path / "b"), "--points", "20", "400", "1260", "400")
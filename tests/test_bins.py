@@ -0,0 +1,48 @@
+from bins import TimeBins
+
+
+class ListSink:
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+
+def test_bins_close_as_time_passes():
+    sink = ListSink()
+    bins = TimeBins((10, 60), sink)
+    bins.add(1.0, "car", "in")
+    bins.add(4.0, "car", "out")
+    bins.add(5.0, "truck", "in", region="a")
+    assert sink.records == []
+    bins.advance(12.0)
+    assert sink.records == [
+        {"bin_seconds": 10, "bin_start": 0, "bin_end": 10, "region": None, "class_name": "car",
+         "in_count": 1, "out_count": 1},
+        {"bin_seconds": 10, "bin_start": 0, "bin_end": 10, "region": "a", "class_name": "truck",
+         "in_count": 1, "out_count": 0},
+    ]
+    bins.close()
+    assert [(r["bin_seconds"], r["class_name"]) for r in sink.records[2:]] == [(60, "car"), (60, "truck")]
+
+
+def test_empty_bins_write_nothing():
+    sink = ListSink()
+    bins = TimeBins((10,), sink)
+    bins.add(1.0, "car", "in")
+    bins.advance(35.0)
+    bins.add(36.0, "car", "in")
+    bins.close()
+    assert [r["bin_start"] for r in sink.records] == [0, 30]
+
+
+def test_state_round_trip():
+    sink = ListSink()
+    bins = TimeBins((10,), sink)
+    bins.add(1.0, "car", "in")
+    restored = TimeBins((10,), sink)
+    restored.load_state_dict(bins.state_dict())
+    restored.add(2.0, "car", "in")
+    restored.close()
+    assert sink.records[0]["in_count"] == 2
@@ -0,0 +1,54 @@
+import csv, os
+
+import pytest
+
+import events
+
+
+def read_rows(paths):
+    rows = []
+    for path in paths:
+        with open(path, newline="") as file:
+            rows.extend(row["track_id"] for row in csv.DictReader(file))
+    return rows
+
+
+def record(track_id):
+    return {"track_id": track_id, "class_name": "car", "direction": "in"}
+
+
+@pytest.mark.parametrize("event_format", ["csv", "jsonl", "sqlite"])
+def test_resume_drops_events_after_the_state(tmp_path, event_format):
+    sink = events.create_event_sink(event_format, str(tmp_path), "cam", flush_records=1)
+    sink.write(record(1))
+    state = sink.state_dict()
+    sink.write(record(2))
+    sink.close()
+
+    resumed = events.create_event_sink(event_format, str(tmp_path), "cam", flush_records=1)
+    resumed.load_state_dict(state)
+    resumed.write(record(3))
+    resumed.close()
+    assert resumed.paths == state["paths"]
+    if event_format == "csv":
+        assert read_rows(resumed.paths) == ["1", "3"]
+
+
+def test_resume_removes_only_its_own_rotated_files(tmp_path):
+    other = tmp_path / "cam_other_run.csv"
+    other.write_text("track_id\n")
+    sink = events.create_event_sink("csv", str(tmp_path), "cam", flush_records=1, rotate_bytes=1)
+    sink.write(record(1))
+    state = sink.state_dict()
+    for track_id in (2, 3):
+        sink.write(record(track_id))
+    sink.close()
+    assert len(sink.paths) == 3
+
+    resumed = events.create_event_sink("csv", str(tmp_path), "cam", flush_records=1, rotate_bytes=1)
+    resumed.load_state_dict(state)
+    resumed.close()
+    assert [os.path.exists(path) for path in sink.paths] == [True, False, False]
+    assert other.exists()
+    resumed.remove_manifest()
+    assert not os.path.exists(state["manifest"])
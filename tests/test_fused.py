@@ -0,0 +1,53 @@
+import cv2
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("ultralytics")
+
+from ultralytics.engine.results import Results
+
+import carCount
+
+
+class TensorDetector:
+    """Stand-in model: one car driving right, predicted in letterboxed model input coordinates."""
+
+    names = {2: "car"}
+
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, source, conf=0.25, classes=None, verbose=False, **kwargs):
+        assert isinstance(source, torch.Tensor) and source.ndim == 4
+        height, width = source.shape[2:]
+        x = 40.0 + 20 * self.calls
+        self.calls += 1
+        boxes = torch.tensor([[x, 100.0, x + 60, 160.0, 0.9, 2.0]])
+        return [Results(np.zeros((height, width, 3), dtype=np.uint8), path="", names=self.names, boxes=boxes)]
+
+    def track(self, *args, **kwargs):
+        raise AssertionError("model.track must not see the letterboxed tensor")
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = str(tmp_path / "road.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 25, (640, 360))
+    # Texture for BoT-SORT's camera motion compensation to find features on, the camera stands still
+    background = np.random.default_rng(0).integers(0, 255, (360, 640, 3), dtype=np.uint8)
+    for _ in range(30):
+        writer.write(background)
+    writer.release()
+    return path
+
+
+@pytest.mark.parametrize("tracker_cfg", ["botsort.yaml", "bytetrack.yaml", "iou"])
+def test_fused_path_tracks_and_counts(video, tmp_path, monkeypatch, tracker_cfg):
+    detector = TensorDetector()
+    monkeypatch.setattr(carCount, "get_model", lambda *args, **kwargs: detector)
+    summary = carCount.start_car_counting(video, None, [640, 0, 640, 720], False, [2], view_img=False,
+                                          csv_dir=str(tmp_path / "csv"), analytics_only=True,
+                                          fused_preprocess=True, tracker_cfg=tracker_cfg)
+    assert detector.calls == summary["frames"] == 30
+    assert summary["in_counts"] + summary["out_counts"] == 1
@@ -0,0 +1,13 @@
+import numpy as np
+import pytest
+
+from geometry import box_iou
+
+
+def test_box_iou_is_pairwise():
+    a = np.array([[0, 0, 10, 10], [20, 20, 30, 30]], dtype=float)
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [100, 100, 110, 110]], dtype=float)
+    iou = box_iou(a, b)
+    assert iou.shape == (2, 3)
+    assert iou[0] == pytest.approx([1, 1 / 3, 0])
+    assert iou[1] == pytest.approx([0, 0, 0])
@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("lap")
+
+from iou_tracker import IOUTracker
+
+
+def detections(boxes, scores=None):
+    boxes = np.array(boxes, dtype=float).reshape(-1, 4)
+    scores = np.full(len(boxes), 0.9) if scores is None else np.array(scores, dtype=float)
+    return SimpleNamespace(xyxy=boxes, conf=scores, cls=np.zeros(len(boxes)))
+
+
+def test_ids_follow_moving_boxes():
+    tracker = IOUTracker()
+    ids = []
+    for f in range(10):
+        output = tracker.update(detections([[10 + 5 * f, 10, 50 + 5 * f, 40], [300, 10 + 5 * f, 340, 40 + 5 * f]]))
+        assert output.shape == (2, 8)
+        np.testing.assert_array_equal(output[:, 7], [0, 1])  # detection index
+        ids.append(output[:, 4].tolist())
+    assert all(frame_ids == ids[0] for frame_ids in ids)
+
+
+def test_low_score_detection_keeps_track_alive():
+    tracker = IOUTracker()
+    box = [[10, 10, 50, 40]]
+    first = tracker.update(detections(box))[0, 4]
+    weak = tracker.update(detections(box, [0.3]))
+    assert weak[:, 4].tolist() == [first]
+    assert tracker.update(detections(box))[0, 4] == first
+
+
+def test_unconfirmed_track_is_not_reported():
+    tracker = IOUTracker()
+    tracker.update(detections([[10, 10, 50, 40]]))
+    assert len(tracker.update(detections([[10, 10, 50, 40], [400, 400, 440, 440]]))) == 1
+    assert len(tracker.update(detections([[10, 10, 50, 40], [400, 400, 440, 440]]))) == 2
+
+
+def test_lost_track_expires_and_age_lost():
+    tracker = IOUTracker(track_buffer=5)
+    box = [[10, 10, 50, 40]]
+    first = tracker.update(detections(box))[0, 4]
+    tracker.update(detections([]))
+    assert tracker.update(detections(box))[0, 4] == first  # re-associated within the buffer
+    tracker.update(detections([]))
+    tracker.age_lost(10)
+    assert len(tracker.ids) == 0
+    assert len(tracker.update(detections(box))) == 0  # a new track, confirmed on its second match
+    assert tracker.update(detections(box))[0, 4] != first
+
+
+def test_age_lost_keeps_tracked_tracks():
+    tracker = IOUTracker(track_buffer=5)
+    first = tracker.update(detections([[10, 10, 50, 40]]))[0, 4]
+    tracker.age_lost(100)
+    assert tracker.update(detections([[10, 10, 50, 40]]))[0, 4] == first
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from regions import RegionSet
+
+REGIONS = {
+    "box": [(0, 0), (100, 0), (100, 100), (0, 100)],
+    "gate": [(200, 0), (200, 100)],
+}
+
+
+def step(regions, slots, known, centroids, prev_positions):
+    return regions.update(np.array(slots), np.array(known), np.array(centroids, dtype=float),
+                          np.array(prev_positions, dtype=float))
+
+
+def test_polygon_in_and_out():
+    regions = RegionSet(REGIONS)
+    nan = [np.nan, np.nan]
+    assert step(regions, [0], [False], [[-10, 50]], [nan]) == []
+    assert step(regions, [0], [True], [[50, 50]], [[-10, 50]]) == [(0, "box", "in")]
+    assert step(regions, [0], [True], [[60, 50]], [[50, 50]]) == []
+    assert step(regions, [0], [True], [[150, 50]], [[60, 50]]) == [(0, "box", "out")]
+
+
+def test_new_track_inside_is_not_counted():
+    regions = RegionSet(REGIONS)
+    assert step(regions, [3], [False], [[50, 50]], [[np.nan, np.nan]]) == []
+    assert step(regions, [3], [True], [[150, 50]], [[50, 50]]) == [(0, "box", "out")]
+
+
+def test_line_direction():
+    regions = RegionSet(REGIONS)
+    # Going from (200, 0) to (200, 100) the right side on screen is x < 200
+    assert step(regions, [0, 1], [True, True], [[190, 50], [210, 50]], [[210, 50], [190, 50]]) == [
+        (0, "gate", "in"), (1, "gate", "out")]
+    assert step(regions, [0], [True], [[210, 150]], [[190, 150]]) == []  # passes below the line
+
+
+def test_record_and_state_round_trip():
+    regions = RegionSet(REGIONS)
+    step(regions, [0], [True], [[50, 50]], [[-10, 50]])
+    regions.record("box", "in", "car")
+    restored = RegionSet(REGIONS)
+    restored.load_state_dict(regions.state_dict())
+    assert restored.summary()["box"] == {"in": 1, "out": 0, "class_counts": {"car": 1}}
+    assert step(restored, [0], [True], [[150, 50]], [[50, 50]]) == [(0, "box", "out")]
+
+
+def test_invalid_region():
+    with pytest.raises(ValueError):
+        RegionSet({"point": [(0, 0)]})
@@ -0,0 +1,22 @@
+from segments import merge_segments
+
+
+def event(track_id, timestamp, direction="in"):
+    return {"track_id": track_id, "timestamp": timestamp, "direction": direction, "class_name": "car"}
+
+
+def test_boundary_duplicates_are_kept_once():
+    # Vehicle 1 of the first segment is vehicle 7 of the second one around the 10 s boundary
+    left = {"events": [event(1, 9.8), event(2, 10.5)], "tracks": {9.8: ([1], [[100.0, 100.0]]),
+                                                                  10.0: ([1], [[110.0, 100.0]])}}
+    right = {"events": [event(7, 9.8), event(8, 11.0)], "tracks": {9.8: ([7], [[101.0, 100.0]]),
+                                                                   10.0: ([7], [[111.0, 100.0]])}}
+    merged = merge_segments([left, right], [10.0])
+    assert [(e["track_id"], e["segment"]) for e in merged] == [(1, 0), (8, 1)]
+
+
+def test_one_sided_events_go_to_the_owning_segment():
+    left = {"events": [event(1, 9.0), event(2, 10.2)], "tracks": {}}
+    right = {"events": [event(5, 9.9), event(6, 10.1)], "tracks": {}}
+    merged = merge_segments([left, right], [10.0])
+    assert [(e["track_id"], e["segment"]) for e in merged] == [(1, 0), (6, 1)]
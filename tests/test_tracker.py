@@ -0,0 +1,118 @@
+from collections import defaultdict
+
+import numpy as np
+import pytest
+from shapely.geometry import LineString, Point, Polygon
+
+from tracker import TrackStore, interpolate_tracks
+
+NAMES = {0: "car", 1: "truck"}
+POLYGON = [(300, 200), (700, 200), (700, 500), (300, 500)]
+LINE = [(500, 0), (500, 720)]
+
+
+def reference_counts(frames, reg_pts):
+    """Counts with the per-box loop ObjectCounter.process_tracks used before it was vectorized."""
+    region = Polygon(reg_pts) if len(reg_pts) >= 3 else LineString(reg_pts)
+    history, counting = defaultdict(list), {}
+    in_counts, out_counts, class_counts, object_info = 0, 0, defaultdict(int), {}
+    for boxes, track_ids, classes in frames:
+        for box, track_id, cls in zip(boxes, track_ids, classes):
+            track_line = history[track_id]
+            track_line.append(((box[0] + box[2]) / 2, (box[1] + box[3]) / 2))
+            if len(track_line) > 30:
+                track_line.pop(0)
+            prev_position = track_line[-2] if len(track_line) > 1 else None
+            if len(reg_pts) >= 3:
+                is_inside = region.contains(Point(track_line[-1]))
+            elif prev_position is not None:
+                is_inside = (box[0] - prev_position[0]) * (region.centroid.x - prev_position[0]) > 0
+            else:
+                counting[track_id] = None
+                continue
+            current_position = "in" if is_inside else "out"
+            if prev_position is not None and counting.get(track_id) != current_position:
+                if is_inside:
+                    in_counts += 1
+                    class_counts[NAMES[cls]] += 1
+                    if len(reg_pts) >= 3:
+                        object_info.setdefault(track_id, NAMES[cls])
+                else:
+                    out_counts += 1
+            counting[track_id] = current_position
+    return in_counts, out_counts, dict(class_counts), set(object_info)
+
+
+def random_frames(seed, num_frames=200, num_tracks=40):
+    """Vehicles driving across a 1280x720 frame, each visible for a while with a few missed detections."""
+    rng = np.random.default_rng(seed)
+    start = rng.integers(0, num_frames - 20, num_tracks)
+    length = rng.integers(10, 80, num_tracks)
+    origin = rng.uniform([0, 0], [1280, 720], (num_tracks, 2))
+    velocity = rng.uniform(-15, 15, (num_tracks, 2))
+    classes = rng.integers(0, 2, num_tracks)
+    frames = []
+    for f in range(num_frames):
+        visible = np.flatnonzero((start <= f) & (f < start + length) & (rng.random(num_tracks) > 0.1))
+        centers = origin[visible] + velocity[visible] * (f - start[visible])[:, None]
+        boxes = np.concatenate([centers - 20, centers + 20], axis=1)
+        frames.append((boxes, (visible + 1).tolist(), classes[visible].tolist()))
+    return frames
+
+
+@pytest.mark.parametrize("reg_pts", [POLYGON, LINE], ids=["polygon", "line"])
+@pytest.mark.parametrize("seed", range(5))
+def test_process_tracks_matches_per_box_loop(reg_pts, seed):
+    pytest.importorskip("ultralytics")
+    from tracker import ObjectCounter
+
+    frames = random_frames(seed)
+    counter = ObjectCounter()
+    counter.set_args(NAMES, reg_pts)
+    for f, (boxes, track_ids, classes) in enumerate(frames):
+        counter.count_tracks(boxes, track_ids, classes, [0, 0, f], f / 30)
+    in_counts, out_counts, class_counts, object_ids = reference_counts(frames, reg_pts)
+    assert (counter.in_counts, counter.out_counts) == (in_counts, out_counts)
+    assert dict(counter.class_counts) == class_counts
+    assert set(counter.object_info) == object_ids
+
+
+def test_track_store_trail_wraps_around():
+    store = TrackStore(trail_len=3, capacity=2)
+    for i in range(5):
+        slots, known = store.lookup([7])
+        store.push_trail(slots, np.array([[i, 0.0]]), i)
+        assert known[0] == (i > 0)
+    slot = store.slots[7]
+    assert store.get_trail(slot) == [(2.0, 0.0), (3.0, 0.0), (4.0, 0.0)]
+    assert store.last_trail_points(np.array([slot])).tolist() == [[4.0, 0.0]]
+    oldest, newest, elapsed = store.trail_window(np.array([slot]), 2)
+    assert oldest.tolist() == [[3.0, 0.0]] and newest.tolist() == [[4.0, 0.0]] and elapsed.tolist() == [1.0]
+
+
+def test_track_store_grows_and_evicts_stale_tracks():
+    store = TrackStore(max_age=4, capacity=2)
+    slots, _ = store.lookup([1, 2, 3])
+    assert store.capacity == 4 and len(set(slots.tolist())) == 3
+    assert np.isnan(store.last_trail_points(slots)).all()
+    for _ in range(8):
+        store.step()
+        store.lookup([3])
+    assert set(store.slots) == {3}
+    slots, known = store.lookup([1])
+    assert not known[0] and store.state[slots[0]] == TrackStore.STATE_NONE
+
+
+def test_interpolate_tracks_common_ids_only():
+    prev_tracks = (np.array([[0, 0, 10, 10], [50, 50, 60, 60]]), [1, 2], [0, 0])
+    next_tracks = (np.array([[30, 0, 40, 10], [100, 0, 110, 10]]), [1, 3], [1, 0])
+    steps = interpolate_tracks(prev_tracks, next_tracks, 2)
+    assert len(steps) == 2
+    for k, (boxes, track_ids, classes) in enumerate(steps, start=1):
+        assert track_ids == [1] and classes == [1]
+        np.testing.assert_allclose(boxes, [[10 * k, 0, 10 + 10 * k, 10]])
+
+
+def test_interpolate_tracks_without_common_ids():
+    steps = interpolate_tracks((np.zeros((1, 4)), [1], [0]), (np.zeros((1, 4)), [2], [0]), 3)
+    assert [len(track_ids) for _, track_ids, _ in steps] == [0, 0, 0]
@@ -0,0 +1,43 @@
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from video_index import FrameScrubber, VideoIndex
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = str(tmp_path / "clip.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 25, (160, 120))
+    for i in range(100):
+        writer.write(np.full((120, 160, 3), 2 * i, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def test_keyframes_are_display_positions(video):
+    index = VideoIndex.build(video)
+    frame_numbers = [frame_no for frame_no, _ in index.keyframes]
+    assert frame_numbers[0] == 0 and frame_numbers == sorted(frame_numbers)
+    for (frame_no, msec) in index.keyframes:
+        assert msec == pytest.approx(frame_no * 40, abs=1)
+    scrubber = FrameScrubber(index, size=(160, 120))
+    position = len(index) - 1
+    assert scrubber.frame_at(position).mean() == pytest.approx(2 * index.keyframes[position][0], abs=3)
+    scrubber.close()
+
+
+def test_stopped_scan_is_not_cached(video, tmp_path):
+    stop_event = threading.Event()
+    stop_event.set()
+    assert VideoIndex.load(video, str(tmp_path / "cache"), stop_event=stop_event) is None
+    assert VideoIndex.load_cached(video, str(tmp_path / "cache")) is None
+    index = VideoIndex.load(video, str(tmp_path / "cache"))
+    assert VideoIndex.load_cached(video, str(tmp_path / "cache")).keyframes == index.keyframes
+
+
+def test_fallback_has_one_seek_point_per_second(video):
+    index = VideoIndex.fallback(video)
+    assert [frame_no for frame_no, _ in index.keyframes] == [0, 25, 50, 75]
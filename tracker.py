@@ -3,12 +3,193 @@
 from collections import defaultdict
 
 import cv2, time
-from ultralytics.utils.checks import check_imshow, check_requirements
-from ultralytics.utils.plotting import Annotator, colors
+import numpy as np
+
+# ultralytics is only imported once a counter is created, so importing this module stays cheap for the GUI
+try:
+    import shapely
+
+    if int(shapely.__version__.split(".")[0]) < 2:
+        raise ImportError("shapely>=2.0.0 is required")
+except ImportError:
+    from ultralytics.utils.checks import check_requirements
+
+    check_requirements("shapely>=2.0.0")
+    import shapely
+from shapely.geometry import LineString, Polygon
+
+from regions import RegionSet
+
+
+def interpolate_tracks(prev_tracks, next_tracks, steps):
+    """
+    Linearly interpolates boxes for the frames skipped between two detections.
+
+    Only tracks present in both detections are interpolated, tracks that appear or disappear in the gap
+    have no reliable position and are left to the next detection.
+
+    Args:
+        prev_tracks (tuple): (boxes, track_ids, classes) of the earlier detection.
+        next_tracks (tuple): (boxes, track_ids, classes) of the later detection.
+        steps (int): Number of skipped frames between the two detections.
+
+    Returns:
+        (list): (boxes, track_ids, classes) for each skipped frame, in order.
+    """
+    prev_boxes, prev_ids, _ = prev_tracks
+    next_boxes, next_ids, next_classes = next_tracks
+    prev_index = {track_id: i for i, track_id in enumerate(prev_ids)}
+    common = [(prev_index[track_id], i) for i, track_id in enumerate(next_ids) if track_id in prev_index]
+    if not common or steps <= 0:
+        return [(np.empty((0, 4)), [], []) for _ in range(steps)]
+
+    prev_idx, next_idx = map(list, zip(*common))
+    start = np.asarray(prev_boxes, dtype=float)[prev_idx]
+    end = np.asarray(next_boxes, dtype=float)[next_idx]
+    track_ids = [next_ids[i] for i in next_idx]
+    classes = [next_classes[i] for i in next_idx]
+    alphas = np.arange(1, steps + 1) / (steps + 1)
+    return [(start + (end - start) * alpha, track_ids, classes) for alpha in alphas]
+
+
+def homography_from_points(image_points, world_points):
+    """
+    Pixel-to-meter calibration from four reference points.
+
+    Args:
+        image_points (list): Four (x, y) points in frame pixels, e.g. the corners of a lane marking.
+        world_points (list): The same four points in meters on the road plane.
+
+    Returns:
+        (ndarray): 3x3 homography mapping frame pixels to road plane meters.
+    """
+    return cv2.getPerspectiveTransform(np.float32(image_points), np.float32(world_points))
+
+
+class TrackStore:
+    """
+    Compact per-track state with a bounded memory footprint.
+
+    Every track id gets a slot in preallocated arrays holding its speed, counting state and a fixed-size ring
+    buffer of recent centroids with their video timestamps. Tracks not seen for `max_age` frames are evicted
+    and their slots reused, so memory stays flat on 24/7 streams.
+
+    Args:
+        trail_len (int): Number of centroids kept per track.
+        max_age (int): Frames without a detection after which a track is evicted.
+        capacity (int): Initial number of slots, doubled whenever all slots are live.
+    """
+
+    STATE_NONE, STATE_IN, STATE_OUT = 0, 1, 2
+
+    def __init__(self, trail_len=30, max_age=300, capacity=256):
+        self.trail_len = trail_len
+        self.max_age = max_age
+        self.frame_idx = 0
+        self.slots = {}  # track id -> slot index
+        self.capacity = 0
+        self.free = []
+        self.ids = np.empty(0, dtype=np.int64)
+        self.last_seen = np.empty(0, dtype=np.int64)
+        self.speed = np.empty(0)
+        self.state = np.empty(0, dtype=np.int8)
+        self.trail = np.empty((0, trail_len, 2))
+        self.trail_time = np.empty((0, trail_len))
+        self.trail_head = np.empty(0, dtype=np.int64)
+        self.trail_size = np.empty(0, dtype=np.int64)
+        self._grow(capacity)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def _grow(self, capacity):
+        extra = capacity - self.capacity
+        self.ids = np.concatenate([self.ids, np.full(extra, -1, dtype=np.int64)])
+        self.last_seen = np.concatenate([self.last_seen, np.zeros(extra, dtype=np.int64)])
+        self.speed = np.concatenate([self.speed, np.full(extra, np.nan)])
+        self.state = np.concatenate([self.state, np.zeros(extra, dtype=np.int8)])
+        self.trail = np.concatenate([self.trail, np.zeros((extra, self.trail_len, 2))])
+        self.trail_time = np.concatenate([self.trail_time, np.zeros((extra, self.trail_len))])
+        self.trail_head = np.concatenate([self.trail_head, np.zeros(extra, dtype=np.int64)])
+        self.trail_size = np.concatenate([self.trail_size, np.zeros(extra, dtype=np.int64)])
+        self.free.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+    def step(self):
+        """Advances the frame counter and evicts tracks that have not been seen for max_age frames."""
+        self.frame_idx += 1
+        if self.frame_idx % max(1, self.max_age // 4):
+            return
+        stale = np.flatnonzero((self.ids >= 0) & (self.frame_idx - self.last_seen > self.max_age))
+        for slot in stale.tolist():
+            del self.slots[int(self.ids[slot])]
+            self.ids[slot] = -1
+            self.free.append(slot)
+
+    def lookup(self, track_ids):
+        """
+        Returns the slots of the given track ids, allocating fresh slots for unseen ids.
+
+        Returns:
+            (tuple): slots (ndarray) and a boolean mask of the ids that were seen before.
+        """
+        slots = np.empty(len(track_ids), dtype=np.int64)
+        known = np.ones(len(track_ids), dtype=bool)
+        for i, track_id in enumerate(track_ids):
+            slot = self.slots.get(track_id)
+            if slot is None:
+                if not self.free:
+                    self._grow(self.capacity * 2)
+                slot = self.free.pop()
+                self.slots[track_id] = slot
+                self.ids[slot] = track_id
+                self.speed[slot] = np.nan
+                self.state[slot] = self.STATE_NONE
+                self.trail_head[slot] = 0
+                self.trail_size[slot] = 0
+                known[i] = False
+            slots[i] = slot
+        self.last_seen[slots] = self.frame_idx
+        return slots, known
+
+    def last_trail_points(self, slots):
+        """Most recent trail point of every slot, nan for slots with an empty trail."""
+        points = self.trail[slots, (self.trail_head[slots] - 1) % self.trail_len]
+        points[self.trail_size[slots] == 0] = np.nan
+        return points
+
+    def push_trail(self, slots, points, timestamp):
+        """Appends one point, taken at video time `timestamp` in seconds, to the ring buffer of every slot."""
+        self.trail[slots, self.trail_head[slots]] = points
+        self.trail_time[slots, self.trail_head[slots]] = timestamp
+        self.trail_head[slots] = (self.trail_head[slots] + 1) % self.trail_len
+        self.trail_size[slots] = np.minimum(self.trail_size[slots] + 1, self.trail_len)
+
+    def trail_window(self, slots, window):
+        """
+        Oldest and newest point within the last `window` trail entries of every slot.
 
-check_requirements("shapely>=2.0.0")
+        Returns:
+            (tuple): oldest points, newest points and the video time elapsed between them in seconds.
+        """
+        size = np.minimum(self.trail_size[slots], window)
+        newest = (self.trail_head[slots] - 1) % self.trail_len
+        oldest = (self.trail_head[slots] - np.maximum(size, 1)) % self.trail_len
+        elapsed = self.trail_time[slots, newest] - self.trail_time[slots, oldest]
+        return self.trail[slots, oldest], self.trail[slots, newest], elapsed
+
+    def get_trail(self, slot):
+        """Trail of one slot as a list of (x, y) tuples, oldest first."""
+        size = self.trail_size[slot]
+        order = (self.trail_head[slot] - size + np.arange(size)) % self.trail_len
+        return [tuple(point) for point in self.trail[slot, order].tolist()]
 
-from shapely.geometry import LineString, Point, Polygon
+    def state_dict(self):
+        """All slots, trails and counting states, plain enough to pickle."""
+        return dict(vars(self))
+
+    def load_state_dict(self, state):
+        self.__dict__.update(state)
 
 
 class ObjectCounter:
@@ -39,36 +220,36 @@ class ObjectCounter:
         self.annotator = None  # Annotator
         self.window_name = "Vehicle counting"
         
-        #All object information
+        #All object information, only kept without an event sink (it is written out once at the end of the run)
         self.object_info = {}
+        self.event_sink = None  # Streaming sink receiving every crossing event, see events.py
+        self.regions = None  # Several named regions/lines counted in one pass, see regions.py
+        self.metrics = None  # Stage latencies of count/display, see metrics.py
+        self.bins = None  # Counts per video time bin, class and direction, see bins.py
 
         # Object counting Information
         self.in_counts = 0
         self.out_counts = 0
-        self.counting_dict = {}
-        self.track_timestamps = {}
         self.count_txt_thickness = 0
         self.count_txt_color = (0, 0, 0)
         self.count_bg_color = (255, 255, 255)
         
         # Speed estimator information
         self.current_time = 0
-        self.dist_data = {}
-        self.trk_idslist = []
         self.spdl_dist_thresh = 10
-        self.trk_previous_times = {}
-        self.trk_previous_points = {}
-        self.trk_previous_times = {}
-
+        self.homography = None
+        self.meters_per_pixel = 1.0
+        self.speed_window = 10
 
-
-        # Tracks info
-        self.track_history = defaultdict(list)
+        # Tracks info, per-track state lives in a bounded store instead of ever-growing dicts
+        self.tracks = TrackStore()
         self.track_thickness = 2
         self.draw_tracks = False
         self.track_color = (0, 255, 0)
 
         # Check if environment support imshow
+        from ultralytics.utils.checks import check_imshow
+
         self.env_check = check_imshow(warn=True)
 
     def set_args(
@@ -89,6 +270,12 @@ class ObjectCounter:
         track_color=(0, 255, 0),
         region_thickness=5,
         line_dist_thresh=15,
+        track_max_age=300,
+        homography=None,
+        meters_per_pixel=1.0,
+        speed_window=10,
+        event_sink=None,
+        regions=None,
     ):
         """
         Configures the Counter's image, bounding box line thickness, and counting region points.
@@ -109,6 +296,12 @@ class ObjectCounter:
             track_color (RGB color): color for tracks
             region_thickness (int): Object counting Region thickness
             line_dist_thresh (int): Euclidean Distance threshold for line counter
+            track_max_age (int): Frames without a detection after which a track's state is dropped
+            homography (ndarray): 3x3 pixel-to-meter homography, see homography_from_points
+            meters_per_pixel (float): Uniform scale used for speed when no homography is given
+            speed_window (int): Number of trail points the speed is averaged over
+            event_sink (events.EventSink): Sink receiving one record per crossing event
+            regions (dict): Named regions {name: [(x, y), ...]} counted together instead of reg_pts
         """
         self.tf = line_thickness
         self.view_img = view_img
@@ -118,7 +311,12 @@ class ObjectCounter:
         self.draw_tracks = draw_tracks
         self.speed_estimation = speed_estimation
         # Region and line selection
-        if len(reg_pts) == 2:
+        if regions:
+            print(f"Multi Region Counter Initiated with {len(regions)} regions.")
+            self.regions = RegionSet(regions)
+            self.reg_pts = []
+            self.counting_region = None
+        elif len(reg_pts) == 2:
             print("Line Counter Initiated.")
             self.reg_pts = reg_pts
             self.counting_region = LineString(self.reg_pts)
@@ -139,6 +337,11 @@ class ObjectCounter:
         self.region_color = count_reg_color
         self.region_thickness = region_thickness
         self.line_dist_thresh = line_dist_thresh
+        self.tracks = TrackStore(max_age=track_max_age)
+        self.homography = None if homography is None else np.asarray(homography, dtype=float)
+        self.meters_per_pixel = meters_per_pixel
+        self.speed_window = speed_window
+        self.event_sink = event_sink
 
     def mouse_event_for_region(self, event, x, y, flags, params):
         """
@@ -174,104 +377,74 @@ class ObjectCounter:
     
 
     
-    def extract_and_process_tracks(self, tracks, time_info):
-        """Extracts and processes tracks for object counting in a video stream."""
+    def state_dict(self):
+        """Counts, recorded objects and per-track state, everything needed to continue counting a video."""
+        return {
+            "in_counts": self.in_counts,
+            "out_counts": self.out_counts,
+            "class_counts": dict(self.class_counts),
+            "object_info": self.object_info,
+            "tracks": self.tracks.state_dict(),
+            "regions": self.regions.state_dict() if self.regions is not None else None,
+            "bins": self.bins.state_dict() if self.bins is not None else None,
+        }
+
+    def load_state_dict(self, state):
+        self.in_counts = state["in_counts"]
+        self.out_counts = state["out_counts"]
+        self.class_counts = defaultdict(int, state["class_counts"])
+        self.object_info.clear()
+        self.object_info.update(state["object_info"])
+        self.tracks.load_state_dict(state["tracks"])
+        if self.regions is not None and state["regions"] is not None:
+            self.regions.load_state_dict(state["regions"])
+        if self.bins is not None and state.get("bins") is not None:
+            self.bins.load_state_dict(state["bins"])
+
+    def to_world(self, points):
+        """Maps (N, 2) frame pixel points to road plane meters."""
+        if self.homography is None:
+            return points * self.meters_per_pixel
+        projected = np.concatenate([points, np.ones((len(points), 1))], axis=1) @ self.homography.T
+        return projected[:, :2] / projected[:, 2:]
+
+    @staticmethod
+    def unpack_tracks(tracks):
+        """
+        Converts model.track results into plain arrays.
 
-        # Annotator Init and region drawing
-        self.annotator = Annotator(self.im0, self.tf, self.names)
+        Returns:
+            (tuple | None): (boxes, track_ids, classes) with boxes as an (N, 4) xyxy numpy array, or None when
+                the frame has no tracked objects.
+        """
+        if tracks[0].boxes.id is None:
+            return None
+        boxes = tracks[0].boxes.xyxy.cpu().numpy()
+        classes = tracks[0].boxes.cls.cpu().tolist()
+        track_ids = tracks[0].boxes.id.int().cpu().tolist()
+        return boxes, track_ids, classes
+
+    def extract_and_process_tracks(self, tracks, time_info, timestamp=None):
+        """Extracts and processes tracks for object counting in a video stream."""
 
-        if tracks[0].boxes.id is not None:
-            boxes = tracks[0].boxes.xyxy.cpu()
-            classes = tracks[0].boxes.cls.cpu().tolist()
-            track_ids = tracks[0].boxes.id.int().cpu().tolist()
-            # Extract tracks
-            for box, track_id, cls in zip(boxes, track_ids, classes):
-                class_name = self.names[cls]
-               
+        # Annotator Init and region drawing, no image means analytics only and nothing is drawn
+        self.annotator = None
+        if self.im0 is not None:
+            from ultralytics.utils.plotting import Annotator
 
-                # Draw bounding box
-                if track_id not in self.trk_previous_times:
-                    self.trk_previous_times[track_id] = time.time_ns()
-                    centroid = Point((box[0] + box[2]) / 2, (box[1] + box[3]) / 2)  # Calculate centroid
-                    self.trk_previous_points[track_id] = centroid
-                else:
-                    current_time = time.time_ns()
-                    delta_time = (current_time - self.trk_previous_times[track_id]) / 1e9  # คำนวณ delta_time
-                    centroid = Point((box[0] + box[2]) / 2, (box[1] + box[3]) / 2)  # Calculate centroid
-                    dist_diff = centroid.distance(self.trk_previous_points[track_id])
-                    speed = (dist_diff / delta_time) * 3.6  # Convert speed to km/hr
-                    self.dist_data[track_id] = speed
-                    self.trk_previous_times[track_id] = current_time
-                    self.trk_previous_points[track_id] = centroid
-                    # Add speed to box label
-                    if self.speed_estimation:
-                        self.annotator.box_label(box, label=f"{track_id}:{class_name}:{speed:.2f} km/hr", color=colors(int(cls), True))
-                    else:
-                        self.annotator.box_label(box, label=f"{track_id}:{class_name}", color=colors(int(cls), True))
-
-                # Draw Tracks
-                track_line = self.track_history[track_id]
-                track_line.append((float((box[0] + box[2]) / 2), float((box[1] + box[3]) / 2)))
-                if len(track_line) > 30:
-                    track_line.pop(0)
-
-                # Draw track trails
-                if self.draw_tracks:
-                    self.annotator.draw_centroid_and_tracks(
-                        track_line, color=self.track_color, track_thickness=self.track_thickness
-                    )
-                prev_position = self.track_history[track_id][-2] if len(self.track_history[track_id]) > 1 else None
-                centroid = Point((box[:2] + box[2:]) / 2)
-                if len(self.reg_pts) >= 3:  # any polygon
-                    is_inside = self.counting_region.contains(centroid)
-                    current_position = "in" if is_inside else "out"
-                    if prev_position is not None:
-                        if self.counting_dict[track_id] != current_position and is_inside:
-                            self.in_counts += 1
-                            self.counting_dict[track_id] = "in"
-                            self.class_counts[class_name] += 1
-                            self.track_timestamps[track_id] = f"{time_info[0]}:{time_info[1]}:{time_info[2]}"
-                            #add speed and time to object
-                            speed = self.dist_data.get(track_id, 0) if self.speed_estimation else None
-                            time_data = self.track_timestamps.get(track_id,0)
-                            
-                            self.object_info.setdefault(track_id, {"class_name":class_name, "speed": speed, "time_data":time_data})
-                            
-                            print(f"all data: {self.object_info}")
-                        elif self.counting_dict[track_id] != current_position and not is_inside:
-                            self.out_counts += 1
-                            self.counting_dict[track_id] = "out"
-                            
-                        else:
-                            self.counting_dict[track_id] = current_position
-
-                    else:
-                        self.counting_dict[track_id] = current_position
-                        
-                   
-
-                elif len(self.reg_pts) == 2:
-                    if prev_position is not None:
-                        is_inside = (box[0] - prev_position[0]) * (
-                            self.counting_region.centroid.x - prev_position[0]
-                        ) > 0
-                        current_position = "in" if is_inside else "out"
-
-                        if self.counting_dict[track_id] != current_position and is_inside:
-                            self.in_counts += 1
-                            self.counting_dict[track_id] = "in"
-                            self.class_counts[class_name] += 1
-                            self.track_timestamps[track_id] = f"{time_info[0]}:{time_info[1]}:{time_info[2]}:"
-                        elif self.counting_dict[track_id] != current_position and not is_inside:
-                            self.out_counts += 1
-                            self.counting_dict[track_id] = "out"
-                        else:
-                            self.counting_dict[track_id] = current_position
-                    else:
-                        self.counting_dict[track_id] = None
+            self.annotator = Annotator(self.im0, self.tf, self.names)
+        self.tracks.step()
 
+        track_data = self.unpack_tracks(tracks)
+        if track_data is not None:
+            self.process_tracks(*track_data, time_info, timestamp)
+        if self.annotator is None:
+            return
 
         count_with_class = {class_name: count for class_name, count in self.class_counts.items()}
+        if self.regions is not None:
+            for name, counts in self.regions.counts.items():
+                count_with_class[name] = f"in {counts['in']} out {counts['out']}"
        
         # Display counts
         if count_with_class:
@@ -281,10 +454,154 @@ class ObjectCounter:
                                              txt_color= self.count_txt_color, 
                                              bg_color= self.count_bg_color, 
                                              margin=10)
+
+    def count_tracks(self, boxes, track_ids, classes, time_info, timestamp=None):
+        """
+        Updates counts for a frame that has no image, e.g. boxes interpolated between two detections.
+
+        Args:
+            boxes (ndarray): (N, 4) xyxy boxes.
+            track_ids (list): Track id of every box.
+            classes (list): Class id of every box.
+            time_info (list): [hours, minutes, seconds] of the frame.
+            timestamp (float): Video time of the frame in seconds, wall-clock time is used when None.
+        """
+        self.annotator = None
+        self.tracks.step()
+        self.process_tracks(boxes, track_ids, classes, time_info, timestamp)
+
+    def process_tracks(self, boxes, track_ids, classes, time_info, timestamp=None):
+        """
+        Updates speed, track history and counts for all boxes of a frame at once.
+
+        Centroids, speeds, the point-in-polygon test and the line side test are computed as array operations,
+        only the per-track dict bookkeeping and label drawing (when an annotator is set) stay per box.
+        """
+        boxes = np.asarray(boxes).reshape(-1, 4)
+        if not len(boxes):
+            return
+        track_ids = list(track_ids)
+        classes = np.asarray(classes)
+        centroids = (boxes[:, :2] + boxes[:, 2:]) / 2
+
+        slots, known = self.tracks.lookup(track_ids)
+        if timestamp is None:
+            timestamp = time.time()
+
+        # Track history, prev_positions holds the previous centroid or nan for new tracks
+        prev_positions = self.tracks.last_trail_points(slots)
+        self.tracks.push_trail(slots, centroids, timestamp)
+        has_prev = ~np.isnan(prev_positions[:, 0])
+
+        # Speed over the trail window in video time, so it does not depend on processing throughput
+        if self.speed_estimation:
+            start, end, elapsed = self.tracks.trail_window(slots, self.speed_window)
+            moving = elapsed > 0
+            dist_diff = np.linalg.norm(self.to_world(end[moving]) - self.to_world(start[moving]), axis=1)
+            self.tracks.speed[slots[moving]] = dist_diff / elapsed[moving] * 3.6  # Convert speed to km/hr
+        speeds = np.nan_to_num(self.tracks.speed[slots])
+
+        # Draw bounding box, tracks seen for the first time have no speed yet and are not labelled
+        if self.annotator is not None:
+            from ultralytics.utils.plotting import colors
+
+            for i in np.flatnonzero(known):
+                track_id, cls = track_ids[i], classes[i]
+                class_name = self.names[cls]
+                if self.speed_estimation:
+                    label = f"{track_id}:{class_name}:{speeds[i]:.2f} km/hr"
+                else:
+                    label = f"{track_id}:{class_name}"
+                self.annotator.box_label(boxes[i], label=label, color=colors(int(cls), True))
+
+        # Draw track trails
+        if self.draw_tracks and self.annotator is not None:
+            for slot in slots:
+                self.annotator.draw_centroid_and_tracks(
+                    self.tracks.get_trail(slot), color=self.track_color, track_thickness=self.track_thickness
+                )
+
+        if self.regions is not None:
+            self.count_regions(slots, known, track_ids, classes, centroids, prev_positions, speeds, time_info, timestamp)
+            return
+
+        if len(self.reg_pts) >= 3:  # any polygon
+            is_inside = shapely.contains_xy(self.counting_region, centroids[:, 0], centroids[:, 1])
+        elif len(self.reg_pts) == 2:
+            with np.errstate(invalid="ignore"):
+                is_inside = (boxes[:, 0] - prev_positions[:, 0]) * (
+                    self.counting_region.centroid.x - prev_positions[:, 0]
+                ) > 0
+        else:
+            return
+        current_states = np.where(is_inside, TrackStore.STATE_IN, TrackStore.STATE_OUT).astype(np.int8)
+        changed = has_prev & (self.tracks.state[slots] != current_states)
+        entered = changed & is_inside
+        exited = changed & ~is_inside
+
+        self.in_counts += int(entered.sum())
+        self.out_counts += int(exited.sum())
+        for cls in classes[entered]:
+            self.class_counts[self.names[cls]] += 1
+
+        time_text = f"{time_info[0]}:{time_info[1]}:{time_info[2]}"
+        if self.event_sink is not None:
+            for i in np.flatnonzero(changed):
+                self.event_sink.write({
+                    "track_id": track_ids[i],
+                    "class_name": self.names[classes[i]],
+                    "direction": "in" if is_inside[i] else "out",
+                    "speed": float(speeds[i]) if self.speed_estimation else None,
+                    "time_data": time_text,
+                    "timestamp": timestamp,
+                })
+        if self.bins is not None:
+            for i in np.flatnonzero(changed):
+                self.bins.add(timestamp, self.names[classes[i]], "in" if is_inside[i] else "out")
+
+        if len(self.reg_pts) >= 3:
+            if self.event_sink is None:
+                for i in np.flatnonzero(entered):
+                    track_id = track_ids[i]
+                    #add speed and time to object
+                    speed = float(speeds[i]) if self.speed_estimation else None
+                    self.object_info.setdefault(track_id, {"class_name": self.names[classes[i]], "speed": speed, "time_data": time_text})
+            self.tracks.state[slots] = current_states
+        else:
+            self.tracks.state[slots] = np.where(has_prev, current_states, TrackStore.STATE_NONE)
+
+    def count_regions(self, slots, known, track_ids, classes, centroids, prev_positions, speeds, time_info, timestamp):
+        """Counts crossings of all named regions, the lifetime counts become totals over the regions."""
+        time_text = f"{time_info[0]}:{time_info[1]}:{time_info[2]}"
+        for i, name, direction in self.regions.update(slots, known, centroids, prev_positions):
+            track_id, class_name = track_ids[i], self.names[classes[i]]
+            speed = float(speeds[i]) if self.speed_estimation else None
+            self.regions.record(name, direction, class_name)
+            if direction == "in":
+                self.in_counts += 1
+                self.class_counts[class_name] += 1
+                if self.event_sink is None:
+                    self.object_info.setdefault(track_id, {"class_name": class_name, "speed": speed, "time_data": time_text})
+            else:
+                self.out_counts += 1
+            if self.event_sink is not None:
+                self.event_sink.write({
+                    "track_id": track_id,
+                    "class_name": class_name,
+                    "direction": direction,
+                    "speed": speed,
+                    "time_data": time_text,
+                    "timestamp": timestamp,
+                    "region": name,
+                })
+            if self.bins is not None:
+                self.bins.add(timestamp, class_name, direction, name)
+
     def display_frames(self):
         """Display frame."""
         if self.env_check:
-            self.annotator.draw_region(reg_pts=self.reg_pts, color=self.region_color, thickness=self.region_thickness)
+            for reg_pts in self.regions.regions.values() if self.regions is not None else [self.reg_pts]:
+                self.annotator.draw_region(reg_pts=reg_pts, color=self.region_color, thickness=self.region_thickness)
             cv2.namedWindow(self.window_name)
             if len(self.reg_pts) == 4:  # only add mouse event If user drawn region
                 cv2.setMouseCallback(self.window_name, self.mouse_event_for_region, {"region_points": self.reg_pts})
@@ -293,19 +610,31 @@ class ObjectCounter:
             if (cv2.waitKey(1) & 0xFF == ord("q")) or (cv2.getWindowProperty(self.window_name, cv2.WND_PROP_VISIBLE) < 1):
                 return
 
-    def start_counting(self, im0, tracks, time_info):
+    def start_counting(self, im0, tracks, time_info, timestamp=None):
         """
         Main function to start the object counting process.
 
         Args:
-            im0 (ndarray): Current frame from the video stream.
+            im0 (ndarray): Current frame from the video stream, None counts without drawing anything.
             tracks (list): List of tracks obtained from the object tracking process.
+            time_info (list): [hours, minutes, seconds] of the frame.
+            timestamp (float): Video time of the frame in seconds, wall-clock time is used when None.
         """
         self.im0 = im0  # store image
-        self.extract_and_process_tracks(tracks, time_info)  # draw region even if no objects
-
-        if self.view_img:
+        metrics = self.metrics
+        start = time.perf_counter() if metrics is not None else 0.0
+        if self.bins is not None and timestamp is not None:
+            self.bins.advance(timestamp)  # bins close on time passing, not only on the next crossing
+        self.extract_and_process_tracks(tracks, time_info, timestamp)  # draw region even if no objects
+        if metrics is not None:
+            metrics.record("count", time.perf_counter() - start)
+            metrics.gauge("active_tracks", len(self.tracks.slots))
+
+        if self.view_img and self.im0 is not None:
+            start = time.perf_counter() if metrics is not None else 0.0
             self.display_frames()
+            if metrics is not None:
+                metrics.record("display", time.perf_counter() - start)
         return self.im0
 
 
@@ -0,0 +1,67 @@
+"""
+Trackers run on their own, outside model.track, on the results of model.predict.
+
+multistream.py gives every stream its own tracker behind one batched model and carCount.py runs the "iou"
+tracker, and every tracker on the fused preprocessing path, this way. Neither torch nor ultralytics is
+imported here: the ultralytics trackers are only loaded when one is asked for, so iou_tracker.IOUTracker
+works on plain numpy detections.
+"""
+
+
+def create_tracker(tracker_cfg="botsort.yaml", frame_rate=30):
+    """
+    Builds a standalone tracker from an ultralytics tracker yaml, the same way model.track does.
+
+    "iou" gives the vectorized iou_tracker.IOUTracker instead.
+    """
+    if tracker_cfg == "iou":
+        from iou_tracker import IOUTracker
+
+        return IOUTracker(frame_rate=frame_rate)
+    from ultralytics.trackers.track import TRACKER_MAP
+    from ultralytics.utils import IterableSimpleNamespace, yaml_load
+    from ultralytics.utils.checks import check_yaml
+
+    cfg = IterableSimpleNamespace(**yaml_load(check_yaml(tracker_cfg)))
+    return TRACKER_MAP[cfg.tracker_type](args=cfg, frame_rate=frame_rate)
+
+
+def track_low_thresh(tracker):
+    """Score down to which detections are worth predicting for `tracker`, its low-score association threshold."""
+    if hasattr(tracker, "track_low_thresh"):
+        return tracker.track_low_thresh
+    return tracker.args.track_low_thresh
+
+
+def uses_frame(tracker):
+    """True when tracker.update reads the frame, i.e. BoT-SORT with a camera motion compensation method."""
+    gmc = getattr(tracker, "gmc", None)
+    return gmc is not None and getattr(gmc, "method", None) not in (None, "none", "None")
+
+
+def apply_tracker(tracker, result, frame, conf=None):
+    """
+    Runs one stream's tracker on a detection result and assigns track ids in place.
+
+    Mirrors ultralytics' on_predict_postprocess_end, so the returned result looks exactly like one
+    coming from model.track(..., persist=True).
+
+    Args:
+        tracker: Tracker with an update(boxes, frame) method, see create_tracker().
+        result (ultralytics.engine.results.Results): Detections of one frame.
+        frame (ndarray): Frame the detections come from, used by trackers with camera motion compensation.
+        conf (float): Score below which boxes are dropped after association. Predicting at the tracker's
+            track_low_thresh and filtering here lets the low-score association round see the weak boxes.
+    """
+    det = result.boxes.cpu().numpy()
+    if len(det):
+        tracks = tracker.update(det, frame)
+        if len(tracks):
+            data = result.boxes.data
+            result = result[tracks[:, -1].astype(int)]
+            # The new boxes keep the device and dtype of the predicted ones, without importing torch here
+            boxes = data.new_tensor(tracks[:, :-1]) if hasattr(data, "new_tensor") else tracks[:, :-1]
+            result.update(boxes=boxes)
+    if conf is not None:
+        result = result[result.boxes.conf >= conf]
+    return result
@@ -0,0 +1,171 @@
+"""
+Keyframe index and thumbnail cache for scrubbing through long videos.
+
+The index is built by reading the compressed packets only (no decoding), recording the timestamp of every
+keyframe and the display frame number derived from it. Packets come in decode order, which is not display
+order in streams with B-frames. Some backends give no timestamps for raw packets (OpenCV's FFmpeg backend for
+H.264), then the packet count is used: in closed GOPs a keyframe's packet count is its display position,
+in open GOPs the B-frames shown before a keyframe but sent after it put the seek point a few frames early. It is cached on disk per file, keyed on path, size and modification time, so a
+multi-GB recording is scanned once. Until the scan is done, VideoIndex.fallback gives one seek point per second
+without reading the file. Seeking to a keyframe decodes a single frame, which makes jumping to any point
+near-instant; decoded thumbnails are kept in a small LRU cache.
+"""
+
+import hashlib, json, os
+from bisect import bisect_right
+from collections import OrderedDict
+
+import cv2
+
+CACHE_DIR = "./output/cache/"
+INDEX_VERSION = 2  # bumped when the cached content changes, older caches are rebuilt
+
+
+def cache_key(video_path):
+    stat = os.stat(video_path)
+    key = f"{os.path.abspath(video_path)}|{stat.st_size}|{stat.st_mtime_ns}|{INDEX_VERSION}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+class VideoIndex:
+    """
+    Frame numbers and timestamps (ms) of the seekable keyframes of one video.
+
+    Args:
+        video_path (str): Video the index belongs to.
+        keyframes (list): (frame number, timestamp ms) of every keyframe, in order.
+        fps (float): Frame rate of the video.
+        frame_count (int): Number of frames in the video.
+    """
+
+    def __init__(self, video_path, keyframes, fps, frame_count):
+        self.video_path = video_path
+        self.keyframes = keyframes
+        self.frame_numbers = [frame_no for frame_no, _ in keyframes]
+        self.fps = fps
+        self.frame_count = frame_count
+
+    def __len__(self):
+        return len(self.keyframes)
+
+    @property
+    def duration(self):
+        return self.frame_count / self.fps if self.fps else 0.0
+
+    def nearest_keyframe(self, frame_no):
+        """Index of the last keyframe at or before frame_no."""
+        return max(0, bisect_right(self.frame_numbers, frame_no) - 1)
+
+    @classmethod
+    def fallback(cls, video_path, step=None):
+        """Seek points every `step` frames (one second by default), built from the header without scanning."""
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        step = step or max(1, int(round(fps)))
+        keyframes = [(frame_no, frame_no * 1000.0 / fps) for frame_no in range(0, max(1, frame_count), step)]
+        return cls(video_path, keyframes, fps, frame_count)
+
+    @classmethod
+    def build(cls, video_path, fallback_step=None, stop_event=None):
+        """
+        Scans the compressed packets of the video for keyframes.
+
+        When the backend cannot return raw packets, every `fallback_step` frames (one second by default)
+        is used as a seek point instead. Returns None when `stop_event` is set during the scan.
+        """
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        keyframes = []
+        if cap.set(cv2.CAP_PROP_FORMAT, -1):
+            packets = 0
+            while cap.grab():
+                if stop_event is not None and stop_event.is_set():
+                    cap.release()
+                    return None
+                if cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                    # CAP_PROP_POS_FRAMES seeks to a display position, taken from the time when there is one
+                    msec = cap.get(cv2.CAP_PROP_POS_MSEC)
+                    if packets and not msec:
+                        keyframes.append((packets, packets * 1000.0 / fps))
+                    else:
+                        keyframes.append((int(round(msec * fps / 1000)), msec))
+                packets += 1
+            frame_count = packets or frame_count
+            keyframes.sort()
+        cap.release()
+
+        if not keyframes:
+            return cls.fallback(video_path, fallback_step)
+        return cls(video_path, keyframes, fps, frame_count)
+
+    @classmethod
+    def load_cached(cls, video_path, cache_dir=CACHE_DIR):
+        """Returns the cached index of the video, None when it has not been built yet."""
+        path = os.path.join(cache_dir, f"{cache_key(video_path)}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as file:
+            data = json.load(file)
+        return cls(video_path, [tuple(k) for k in data["keyframes"]], data["fps"], data["frame_count"])
+
+    @classmethod
+    def load(cls, video_path, cache_dir=CACHE_DIR, stop_event=None):
+        """Returns the cached index of the video, building and caching it on first use, None when stopped."""
+        index = cls.load_cached(video_path, cache_dir)
+        if index is not None:
+            return index
+
+        path = os.path.join(cache_dir, f"{cache_key(video_path)}.json")
+        index = cls.build(video_path, stop_event=stop_event)
+        if index is None:
+            return None
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"video_path": video_path, "fps": index.fps, "frame_count": index.frame_count,
+                       "keyframes": index.keyframes}, file)
+        os.replace(tmp_path, path)
+        return index
+
+
+class FrameScrubber:
+    """
+    Returns display-sized RGB frames at keyframe positions, keeping one capture open.
+
+    Args:
+        index (VideoIndex): Keyframe index of the video.
+        size (tuple): (width, height) of the returned frames.
+        cache_size (int): Number of decoded thumbnails kept in the LRU cache.
+    """
+
+    def __init__(self, index, size=(1280, 720), cache_size=16):
+        self.index = index
+        self.size = size
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.cap = cv2.VideoCapture(index.video_path)
+
+    def frame_at(self, position):
+        """RGB frame of keyframe number `position` of the index, None if it cannot be decoded."""
+        if position in self.cache:
+            self.cache.move_to_end(position)
+            return self.cache[position]
+
+        frame_no, _ = self.index.keyframes[position]
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_no)
+        success, frame = self.cap.read()
+        if not success:
+            return None
+        frame = cv2.cvtColor(cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+
+        self.cache[position] = frame
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return frame
+
+    def close(self):
+        self.cap.release()
+        self.cache.clear()
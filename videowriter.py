@@ -0,0 +1,151 @@
+"""
+Video output off the counting thread.
+
+AsyncVideoWriter encodes on a background thread fed by a bounded queue. The output takes the size of the
+first frame and the frame rate it is given, and can start a new file every `rotate_seconds` of video time
+for 24/7 feeds. With timed=True every frame is placed at the position its timestamp gives (repeated to fill
+gaps, skipped when early), so a live feed with dropped frames still plays back in real time.
+
+ClipRecorder keeps the last `pre_seconds` of frames in a ring buffer and only encodes short clips around
+counted crossings (pre-roll + post-roll, extended while crossings keep coming), so the encoder is idle
+most of the time and every count still has footage.
+"""
+
+import os, queue, threading
+from collections import deque
+
+import cv2
+
+_END = object()
+
+
+class AsyncVideoWriter:
+    """
+    cv2.VideoWriter running on its own thread.
+
+    Args:
+        path (str): Output file, with rotation a _partN suffix is added before the extension.
+        fps (float): Frame rate of the output.
+        queue_size (int): Frames buffered before write() blocks.
+        rotate_seconds (float): Start a new file every this many seconds of video time, None disables.
+        fourcc (str): Codec of the output.
+        timed (bool): Place frames by their timestamps instead of writing each exactly once.
+    """
+
+    def __init__(self, path, fps, queue_size=32, rotate_seconds=None, fourcc="mp4v", timed=False):
+        self.path = path
+        self.fps = fps
+        self.rotate_seconds = rotate_seconds
+        self.timed = timed
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.paths = []
+        self.frames = 0
+        self.file_frames = 0
+        self.writer = None
+        self.file_start = None
+        self.error = None
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _open(self, frame, timestamp):
+        if self.writer is not None:
+            self.writer.release()
+        path = self.path
+        if self.rotate_seconds is not None:
+            root, ext = os.path.splitext(self.path)
+            path = f"{root}_part{len(self.paths) + 1}{ext}"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        height, width = frame.shape[:2]
+        self.writer = cv2.VideoWriter(path, self.fourcc, self.fps, (width, height))
+        self.paths.append(path)
+        self.file_start = timestamp
+        self.file_frames = 0
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _END:
+                break
+            if self.error is not None:
+                continue  # keep draining so write() never blocks on a dead writer
+            frame, timestamp = item
+            try:
+                if self.writer is None or (self.rotate_seconds is not None
+                                           and timestamp - self.file_start >= self.rotate_seconds):
+                    self._open(frame, timestamp)
+                repeats = 1
+                if self.timed:
+                    # Frames the file should hold once this one is in
+                    repeats = int(round((timestamp - self.file_start) * self.fps)) + 1 - self.file_frames
+                for _ in range(repeats):
+                    self.writer.write(frame)
+                self.file_frames += max(0, repeats)
+                self.frames += max(0, repeats)
+            except Exception as error:
+                self.error = error
+        if self.writer is not None:
+            self.writer.release()
+
+    def write(self, frame, timestamp=0.0):
+        """Queues a frame taken at video time `timestamp` (seconds), blocks while the buffer is full."""
+        if self.error is not None:
+            raise self.error
+        self.queue.put((frame, timestamp))
+
+    def release(self):
+        """Writes out the buffered frames and closes the file."""
+        self.queue.put(_END)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+class ClipRecorder:
+    """
+    Records only the footage around counted crossings.
+
+    Args:
+        directory (str): Directory the clips are written to, named by the video time of their first frame.
+        fps (float): Frame rate of the frames passed to write().
+        pre_seconds (float): Footage kept from before the crossing.
+        post_seconds (float): Footage recorded after the last crossing of a clip.
+        timed (bool): Place frames by their timestamps, see AsyncVideoWriter.
+    """
+
+    def __init__(self, directory, fps, pre_seconds=2.0, post_seconds=2.0, timed=False):
+        self.directory = directory
+        self.fps = fps
+        self.timed = timed
+        self.post_seconds = post_seconds
+        self.ring = deque(maxlen=max(1, int(round(pre_seconds * fps))))
+        self.clip = None
+        self.clip_end = None
+        self.paths = []
+
+    def trigger(self, timestamp):
+        """Marks a crossing at video time `timestamp`, starting a clip or extending the open one."""
+        if self.clip is None:
+            start = self.ring[0][1] if self.ring else timestamp
+            path = os.path.join(self.directory, f"clip_{start:011.3f}.mp4")
+            self.clip = AsyncVideoWriter(path, self.fps, timed=self.timed)
+            self.paths.append(path)
+            for frame, frame_time in self.ring:
+                self.clip.write(frame, frame_time)
+            self.ring.clear()
+        self.clip_end = timestamp + self.post_seconds
+
+    def write(self, frame, timestamp=0.0):
+        if self.clip is None:
+            self.ring.append((frame, timestamp))
+            return
+        self.clip.write(frame, timestamp)
+        if timestamp >= self.clip_end:
+            self.clip.release()
+            self.clip = None
+
+    def release(self):
+        if self.clip is not None:
+            self.clip.release()
+            self.clip = None
+        self.ring.clear()